@@ -1,21 +1,1131 @@
 import os
 import re
-import openpyxl
+import html
+import json
+import hashlib
+import zipfile
+import datetime
+import importlib.util
+from collections import OrderedDict
+import numpy as np
 import pandas as pd
 from difflib import get_close_matches
-import customtkinter as ctk
-from tkinter import Label, filedialog, messagebox, StringVar, BooleanVar
+from functools import lru_cache
+from pandas.io.parsers import TextParser
+from pandas.tseries.api import guess_datetime_format
+try:
+    import customtkinter as ctk
+    from tkinter import Label, filedialog, messagebox, StringVar, BooleanVar
+except ImportError:
+    # Batch mode runs without a display toolkit
+    ctk = None
+import sys
+import time
+import logging
+import argparse
+import queue
+import threading
+import cProfile
+import tracemalloc
+import contextlib
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 import webbrowser
+from xml.sax.saxutils import escape
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
 from openpyxl.reader.excel import load_workbook
-from openpyxl.utils.dataframe import dataframe_to_rows
+from openpyxl.utils import column_index_from_string, get_column_letter
 from openpyxl.workbook import Workbook
-from openpyxl.styles import Alignment, Font
+from openpyxl.styles import Alignment, Border, Font, Side
+from openpyxl.styles.numbers import BUILTIN_FORMATS_REVERSE
+from openpyxl.utils.datetime import CALENDAR_MAC_1904, CALENDAR_WINDOWS_1900, from_excel, to_excel
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+
+# Diagnostics of the processors. At the default INFO level no DataFrame is formatted; GDEC_LOG_LEVEL=DEBUG
+# (or --log-level DEBUG in batch mode) also logs the frames and matched IDs of each step
+logger = logging.getLogger("gdec_price_checker")
+
+# Excel engines for reading and writing, None lets the file size decide; openpyxl is always the fallback
+EXCEL_ENGINES = {
+    'read': os.environ.get("GDEC_READ_ENGINE") or None,
+    'write': os.environ.get("GDEC_WRITE_ENGINE") or None
+}
+ENGINE_MODULES = {'openpyxl': 'openpyxl', 'calamine': 'python_calamine', 'xlsxwriter': 'xlsxwriter'}
+LARGE_INPUT_BYTES = 5 * 1024 * 1024
+LARGE_OUTPUT_ROWS = 50000
+
+# Upload files laid out like the TB itself are written into a copy of the seller's TB ('template'), keeping its
+# description rows, styles, validations and other sheets; 'rebuild' writes a new workbook instead
+OUTPUT_MODE = os.environ.get("GDEC_OUTPUT_MODE") or 'template'
+
+# Campaign sheet of the PWP workbook for each platform
+PROMO_SHEETS = {
+    'lazada': "Lzd | Campaign List",
+    'shopee': "Shp | Campaign List",
+    'tiktok': "TikTok | Campaign List"
+}
+
+# Other names a TB or PWP column goes by, tried after the name itself and before fuzzy matching
+PWP_COLUMN_ALIASES = {
+    'Promo Name (Scheme)': ['Promo Name', 'Scheme'],
+    'Discounted Price/ASP (VATIN)': ['Discounted Price', 'ASP (VATIN)']
+}
+COLUMN_ALIASES = {
+    'lazada': {
+        **PWP_COLUMN_ALIASES,
+        'Shop Sku': ['ShopSku'],
+        'SHOP SKU': ['Shop Sku', 'ShopSku'],
+        'SpecialPrice': ['Special Price'],
+        'SpecialPrice Start': ['Special Price Start'],
+        'SpecialPrice End': ['Special Price End']
+    },
+    'shopee': {
+        **PWP_COLUMN_ALIASES,
+        'Variation ID': ['Variation Id', 'Model ID'],
+        'Recommended Campaign Price': ['Recommended Price'],
+        'Discount price': ['Discounted Price']
+    },
+    'tiktok': {
+        **PWP_COLUMN_ALIASES,
+        'SKU_id (required)': ['SKU ID', 'SKU_id'],
+        'Product_id (required)': ['Product ID', 'Product_id'],
+        'Deal Price (required)': ['Deal Price'],
+        'Product Id': ['Product ID']
+    }
+}
+
+# Columns each campaign sheet is read with, covering both the regular and the manual processor of the platform
+PWP_SHEET_COLUMNS = {
+    "Lzd | Campaign List": {
+        'Promo Name (Scheme)': 'text',
+        'SHOP SKU': 'id',
+        'Discounted Price/ASP (VATIN)': 'price',
+        'Date Start': 'datetime',
+        'Date End': 'datetime',
+        'Time Start': 'raw',
+        'Time End': 'raw'
+    },
+    "Shp | Campaign List": {
+        'Promo Name (Scheme)': 'text',
+        'Variation ID': 'id',
+        'Product ID': 'id',
+        'Discounted Price/ASP (VATIN)': 'price'
+    },
+    "TikTok | Campaign List": {
+        'Promo Name (Scheme)': 'text',
+        'SKU ID': 'id',
+        'Product Id': 'id',
+        'Discounted Price/ASP (VATIN)': 'price'
+    }
+}
+
+# Matching keys of long columns are Arrow-backed strings when pyarrow is installed, a fraction of the memory of
+# Python str objects. Loading Arrow's string kernels costs about 15 MB, which shorter columns never win back
+ID_DTYPE = pd.StringDtype('pyarrow') if pa is not None else None
+ARROW_IDS_MIN_ROWS = 150000
+
+# 1-based row of the campaign list header; the rows above it are the sheet's title block
+PWP_HEADER_ROW = 6
+
+# Columns the promo index of a campaign sheet is built from
+PROMO_INDEX_COLUMNS = {
+    'Promo Name (Scheme)': 'text',
+    'Date Start': 'datetime',
+    'Date End': 'datetime'
+}
+
+# Campaign sheet XML is scanned in blocks of about this size
+SCAN_BLOCK_BYTES = 8 * 1024 * 1024
+
+PWP_CACHE_MAX_ENTRIES = 6
+PWP_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+
+# Parsed campaign sheets keyed by (path, size, mtime, sheet), least recently used first
+pwp_cache = OrderedDict()
+
+APP_DATA_DIR = os.path.join(os.environ.get("LOCALAPPDATA") or os.path.expanduser("~"), "GDEC Price-Checker")
+
+PWP_DISK_CACHE_DIR = os.path.join(APP_DATA_DIR, "pwp_cache")
+PWP_DISK_CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024
+
+# Python types openpyxl hands back in object columns, so a cached sheet round-trips cell for cell
+CELL_KINDS = {str: 1, int: 2, float: 3, bool: 4, datetime.datetime: 5, pd.Timestamp: 5, datetime.time: 6}
+KIND_ARRAYS = {1: 'str', 2: 'int', 3: 'float', 4: 'int', 5: 'datetime', 6: 'time'}
+
+
+def file_content_hash(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def pwp_disk_cache_path(content_hash, sheet_name):
+    sheet_key = json.dumps([sheet_name, PWP_SHEET_COLUMNS.get(sheet_name)])
+    sheet_hash = hashlib.sha256(sheet_key.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(PWP_DISK_CACHE_DIR, f"{content_hash}-{sheet_hash}.arrow")
+
+
+def encode_label(label):
+    if label is None:
+        return ['none', None]
+    if isinstance(label, (datetime.datetime, datetime.time)):
+        return [type(label).__name__, label.isoformat()]
+    if isinstance(label, float) and np.isnan(label):
+        return ['nan', None]
+    if isinstance(label, (bool, int, float)):
+        return [type(label).__name__, label]
+    return ['str', str(label)]
+
+
+def decode_label(spec):
+    kind, value = spec
+    if kind == 'nan':
+        return np.nan
+    if kind == 'none':
+        return None
+    if kind in ('datetime', 'Timestamp'):
+        return datetime.datetime.fromisoformat(value)
+    if kind == 'time':
+        return datetime.time.fromisoformat(value)
+    return value
+
+
+def pwp_sheet_to_arrow(pwp_df):
+    arrays = {}
+    columns = []
+    for i, (label, column) in enumerate(pwp_df.items()):
+        if column.dtype != object:
+            arrays[f"{i}.native"] = pa.array(column)
+            columns.append({'label': encode_label(label), 'arrays': ['native']})
+            continue
+
+        values = column.to_numpy()
+        kinds = column.map(lambda value: CELL_KINDS.get(type(value), -1)).to_numpy(dtype=np.int8)
+        kinds[column.isna().to_numpy()] = 0
+        if (kinds == -1).any():
+            raise TypeError(f"Unsupported cell type in PWP column {label!r}")
+
+        present = sorted({KIND_ARRAYS[kind] for kind in np.unique(kinds) if kind})
+        arrays[f"{i}.kind"] = pa.array(kinds)
+        if 'str' in present:
+            arrays[f"{i}.str"] = pa.array(np.where(kinds == 1, values, ''), pa.string())
+        if 'int' in present:
+            arrays[f"{i}.int"] = pa.array(np.where((kinds == 2) | (kinds == 4), values, 0).astype(np.int64))
+        if 'float' in present:
+            arrays[f"{i}.float"] = pa.array(np.where(kinds == 3, values, 0.0).astype(np.float64))
+        if 'datetime' in present:
+            arrays[f"{i}.datetime"] = pa.array(np.where(kinds == 5, values, datetime.datetime(1970, 1, 1)), pa.timestamp('us'))
+        if 'time' in present:
+            arrays[f"{i}.time"] = pa.array(np.where(kinds == 6, values, datetime.time(0)), pa.time64('us'))
+        columns.append({'label': encode_label(label), 'arrays': present})
+
+    metadata = {'columns': columns, 'columns_name': encode_label(pwp_df.columns.name), 'rows': len(pwp_df)}
+    table = pa.table(arrays) if arrays else pa.table({})
+    return table.replace_schema_metadata({'gdec': json.dumps(metadata)})
+
+
+def pwp_sheet_from_arrow(table):
+    metadata = json.loads(table.schema.metadata[b'gdec'])
+    data = {}
+    for i, column in enumerate(metadata['columns']):
+        if column['arrays'] == ['native']:
+            data[i] = table.column(f"{i}.native").to_pandas()
+            continue
+
+        kinds = table.column(f"{i}.kind").to_numpy()
+        values = np.full(len(kinds), np.nan, dtype=object)
+        for name in column['arrays']:
+            array = table.column(f"{i}.{name}").to_numpy(zero_copy_only=False)
+            if name == 'int':
+                values[kinds == 2] = array[kinds == 2]
+                values[kinds == 4] = array[kinds == 4].astype(bool)
+            elif name == 'float':
+                values[kinds == 3] = array[kinds == 3]
+            elif name == 'datetime':
+                values[kinds == 5] = array[kinds == 5].astype('datetime64[us]').astype(object)
+            else:
+                kind = 1 if name == 'str' else 6
+                values[kinds == kind] = array[kinds == kind]
+        data[i] = pd.Series(values, dtype=object, copy=False)
+
+    pwp_df = pd.DataFrame(data, index=pd.RangeIndex(metadata['rows']))
+    pwp_df.columns = pd.Index([decode_label(column['label']) for column in metadata['columns']], dtype=object,
+                              name=decode_label(metadata['columns_name']))
+    return pwp_df
+
+
+def load_cached_pwp_sheet(content_hash, sheet_name):
+    cache_path = pwp_disk_cache_path(content_hash, sheet_name)
+    if not os.path.exists(cache_path):
+        return None
+
+    with pa.memory_map(cache_path) as source:
+        pwp_df = pwp_sheet_from_arrow(pa.ipc.open_file(source).read_all())
+
+    # Touch the entry so eviction drops the least recently opened sheets first
+    os.utime(cache_path)
+    return pwp_df
+
+
+def temp_file_path(file_path):
+    # A name beside file_path that no other process or thread is writing at the same time
+    return f"{file_path}.{os.getpid()}-{threading.get_ident()}.tmp"
+
+
+def store_pwp_sheet(content_hash, sheet_name, pwp_df):
+    os.makedirs(PWP_DISK_CACHE_DIR, exist_ok=True)
+    cache_path = pwp_disk_cache_path(content_hash, sheet_name)
+    # Process-pool workers may store the same sheet at once, each through its own temporary file
+    temp_path = temp_file_path(cache_path)
+
+    table = pwp_sheet_to_arrow(pwp_df)
+    try:
+        with pa.OSFile(temp_path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        os.replace(temp_path, cache_path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(temp_path)
+        raise
+
+    entries = [os.path.join(PWP_DISK_CACHE_DIR, name) for name in os.listdir(PWP_DISK_CACHE_DIR) if name.endswith(".arrow")]
+    entries.sort(key=os.path.getmtime)
+    total_size = sum(os.path.getsize(entry) for entry in entries)
+    for entry in entries[:-1]:
+        if total_size <= PWP_DISK_CACHE_MAX_BYTES:
+            break
+        total_size -= os.path.getsize(entry)
+        os.remove(entry)
+
+
+def engine_available(engine):
+    module = ENGINE_MODULES.get(engine)
+    return module is not None and importlib.util.find_spec(module) is not None
+
+
+def pick_engine(operation, preferred, use_preferred):
+    engine = EXCEL_ENGINES[operation]
+    if engine:
+        if engine_available(engine):
+            return engine
+        logger.warning("Excel %s engine '%s' is not available, using openpyxl.", operation, engine)
+        return 'openpyxl'
+    return preferred if use_preferred and engine_available(preferred) else 'openpyxl'
+
+
+def pick_read_engine(file_path):
+    return pick_engine('read', 'calamine', os.path.getsize(file_path) >= LARGE_INPUT_BYTES)
+
+
+def pick_write_engine(row_count):
+    return pick_engine('write', 'xlsxwriter', row_count >= LARGE_OUTPUT_ROWS)
+
+
+def iter_sheet_rows(file_path, sheet_name):
+    # Rows of one sheet as sequences of cell values, blank leading rows included
+    if pick_read_engine(file_path) == 'calamine':
+        from python_calamine import CalamineWorkbook
+
+        with CalamineWorkbook.from_path(file_path) as workbook:
+            if sheet_name not in workbook.sheet_names:
+                raise ValueError(f"Worksheet named '{sheet_name}' not found")
+            yield from workbook.get_sheet_by_name(sheet_name).iter_rows()
+        return
+
+    workbook = load_workbook(file_path, read_only=True, data_only=True, keep_links=False)
+    try:
+        if sheet_name not in workbook.sheetnames:
+            raise ValueError(f"Worksheet named '{sheet_name}' not found")
+        worksheet = workbook[sheet_name]
+        worksheet.reset_dimensions()
+        yield from worksheet.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def normalize_header(name):
+    return re.sub(r'\s+', '', str(name)).lower()
+
+
+@lru_cache(maxsize=1024)
+def resolve_header(platform, headers, target_col):
+    # Memoized by the header row, so the same template resolves instantly on every later run
+    names = [target_col] + COLUMN_ALIASES.get(platform, {}).get(target_col, [])
+    for name in names:
+        if name in headers:
+            return name, 'exact' if name == target_col else 'alias'
+    normalized_headers = [normalize_header(header) for header in headers]
+    for name in names:
+        if normalize_header(name) in normalized_headers:
+            return headers[normalized_headers.index(normalize_header(name))], 'case/space-insensitive'
+    for name in names:
+        matches = get_close_matches(name, headers, n=1, cutoff=0.6)
+        if matches:
+            return matches[0], 'fuzzy'
+    return None, 'not found'
+
+
+def resolve_column(platform, df, target_col):
+    # The df's own column label for target_col, or None when nothing in the header matches
+    report_progress('Resolving headers')
+    headers = tuple(str(col) for col in df.columns)
+    match, how = resolve_header(platform, headers, target_col)
+    if match is None:
+        logger.warning("Column '%s' not found", target_col)
+    else:
+        logger.log(logging.DEBUG if how == 'exact' else logging.INFO, "Column '%s' -> '%s' (%s)", target_col, match, how)
+    return df.columns[headers.index(match)] if match is not None else None
+
+
+def convert_cell(value):
+    # Same conversions pandas applies to reader values: blanks are NaN, whole floats are ints, dates are datetimes
+    if value is None or value == '':
+        return np.nan
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if type(value) is datetime.date:
+        return datetime.datetime.combine(value, datetime.time())
+    return value
+
+
+def type_pwp_column(values, kind):
+    column = pd.Series([convert_cell(value) for value in values], dtype=object)
+    if kind == 'text':
+        # Promo names repeat on every row of a promo, so each distinct name is stored once
+        return column.where(column.isna(), column.astype(str)).astype('category')
+    if kind == 'id':
+        return ids_as_text(column)
+    if kind == 'datetime':
+        return pd.to_datetime(column, errors='coerce')
+    # Text prices stay as they are so the processors can still escalate them as invalid
+    if kind == 'price' and not column.map(lambda value: isinstance(value, str)).any():
+        return column.astype(float)
+    return column
+
+
+def sheet_platform(sheet_name):
+    return next((platform for platform, promo_sheet in PROMO_SHEETS.items() if promo_sheet == sheet_name), None)
+
+
+def read_pwp_columns(pwp_file_path, sheet_name, columns):
+    rows = iter_sheet_rows(pwp_file_path, sheet_name)
+    try:
+        for _ in range(PWP_HEADER_ROW - 1):
+            next(rows, None)
+        header = tuple(next(rows, ()))
+        header_names = [str(col) for col in header]
+
+        platform = sheet_platform(sheet_name)
+        selected = {}
+        for target_col, kind in columns.items():
+            match, _ = resolve_header(platform, tuple(header_names), target_col)
+            if match is not None:
+                selected.setdefault(header_names.index(match), kind)
+        indices = sorted(selected)
+        width = indices[-1] + 1 if indices else 0
+
+        data = [[] for _ in indices]
+        last_row = 0
+        for row_count, row in enumerate(rows, start=1):
+            if len(row) < width:
+                row = tuple(row) + (None,) * (width - len(row))
+            for values, index in zip(data, indices):
+                value = row[index]
+                values.append(value)
+                if value is not None and value != '':
+                    last_row = row_count
+    finally:
+        rows.close()
+
+    # Trailing blank rows are dropped, same as pd.read_excel
+    return pd.DataFrame({header[index]: type_pwp_column(values[:last_row], selected[index])
+                         for index, values in zip(indices, data)})
+
+
+def workbook_parts(workbook_zip):
+    # Part path of each sheet by name in workbook order (None when the sheet's relationship is missing) and the
+    # path of the shared strings part
+    relationships = {}
+    for relationship in re.findall(rb'<Relationship\b[^>]*>', workbook_zip.read('xl/_rels/workbook.xml.rels')):
+        attributes = xml_attributes(relationship)
+        target = attributes.get('Target', '')
+        relationships[attributes.get('Id')] = (attributes.get('Type', ''),
+                                               target.lstrip('/') if target.startswith('/') else 'xl/' + target)
+    sheets = {}
+    for sheet in re.findall(rb'<sheet\b[^>]*>', workbook_zip.read('xl/workbook.xml')):
+        attributes = xml_attributes(sheet)
+        sheets[html.unescape(attributes.get('name', ''))] = relationships.get(attributes.get('r:id'), (None, None))[1]
+    shared_strings = next((part for part_type, part in relationships.values() if part_type.endswith('/sharedStrings')), None)
+    return sheets, shared_strings
+
+
+def xml_blocks(part_file, end_tag):
+    # The part's XML a block at a time, each block ending just after an end_tag so no element is split
+    rest = b''
+    while True:
+        chunk = part_file.read(SCAN_BLOCK_BYTES)
+        if not chunk:
+            if rest:
+                yield rest
+            return
+        block = rest + chunk
+        cut = block.rfind(end_tag)
+        if cut == -1:
+            rest = block
+            continue
+        cut += len(end_tag)
+        rest = block[cut:]
+        yield block[:cut]
+
+
+def xml_text(xml):
+    # Text of a shared or inline string: its <t> runs, without the phonetic runs
+    xml = re.sub(rb'<rPh\b.*?</rPh>', b'', xml, flags=re.S)
+    return html.unescape(b''.join(re.findall(rb'<t(?:\s[^>]*)?(?<!/)>(.*?)</t>', xml, re.S)).decode('utf-8'))
+
+
+def shared_strings_at(workbook_zip, part, indices):
+    # Text of the shared strings at the given indices; the part is read only as far as the last of them
+    strings = {}
+    if not indices or part is None:
+        return strings
+    last = max(indices)
+    position = 0
+    with workbook_zip.open(part) as part_file:
+        for block in xml_blocks(part_file, b'</si>'):
+            for item in re.finditer(rb'<si\b[^>]*?(?:/>|>(.*?)</si>)', block, re.S):
+                if position in indices:
+                    strings[position] = xml_text(item.group(1) or b'')
+                if position == last:
+                    return strings
+                position += 1
+    return strings
+
+
+def sheet_cell_value(attributes, content, epoch, as_date):
+    # Value of one <c> element as the Excel readers give it. A shared string comes back as its index in a tuple,
+    # numbers in a date column as datetimes
+    kind = re.search(rb'\st="(\w+)"', attributes)
+    kind = kind.group(1) if kind else b'n'
+    if not content:
+        return None
+    if kind == b'inlineStr':
+        return xml_text(content)
+    value = re.search(rb'<v(?:\s[^>]*)?>(.*?)</v>', content, re.S)
+    if value is None:
+        return None
+    value = value.group(1)
+    if kind == b's':
+        return (int(value),)
+    if kind == b'b':
+        return value.strip() == b'1'
+    if kind in (b'str', b'e'):
+        return html.unescape(value.decode('utf-8'))
+    if kind == b'd':
+        return datetime.datetime.fromisoformat(value.decode('ascii'))
+    number = float(value)
+    if as_date:
+        return from_excel(number, epoch)
+    return int(number) if number.is_integer() else number
+
+
+def scan_sheet_columns(file_path, sheet_name, columns):
+    # Same frame as read_pwp_columns, read straight from the sheet's XML so that only the cells of the wanted
+    # columns are decoded. Cell styles are not read, so numbers become dates in 'datetime' columns only and
+    # 'raw' columns keep Excel's serial numbers. Expects cells to carry their reference first, as Excel and the
+    # common xlsx writers write them; raises ValueError (or KeyError / BadZipFile) for anything else
+    with zipfile.ZipFile(file_path) as workbook_zip:
+        sheets, shared_strings = workbook_parts(workbook_zip)
+        if not sheets.get(sheet_name):
+            raise ValueError(f"Worksheet named '{sheet_name}' not found")
+        date1904 = re.search(rb'<workbookPr\b[^>]*\bdate1904="(1|true)"', workbook_zip.read('xl/workbook.xml'))
+        epoch = CALENDAR_MAC_1904 if date1904 else CALENDAR_WINDOWS_1900
+
+        header_cell = re.compile(rb'<c r="([A-Z]+)' + str(PWP_HEADER_ROW).encode() + rb'"([^>]*?)(?:/>|>(.*?)</c>)', re.S)
+        header = None
+        with workbook_zip.open(sheets[sheet_name]) as sheet_file:
+            for block in xml_blocks(sheet_file, b'</row>'):
+                if block.count(b'<c r="') != block.count(b'<c ') + block.count(b'<c>') + block.count(b'<c/>'):
+                    raise ValueError("cells without a leading reference")
+                if header is None:
+                    # The header row comes within the first block, after the title rows
+                    if b'<sheetData' not in block:
+                        raise ValueError("no sheetData in the default namespace")
+                    header = {column_index_from_string(letters.decode()): sheet_cell_value(attributes, content, epoch, False)
+                              for letters, attributes, content in header_cell.findall(block)}
+                    shared = shared_strings_at(workbook_zip, shared_strings,
+                                               {value[0] for value in header.values() if isinstance(value, tuple)})
+                    header = {c_idx: shared[value[0]] if isinstance(value, tuple) else value for c_idx, value in header.items()}
+                    header_values = [header.get(c_idx) for c_idx in range(1, max(header, default=0) + 1)]
+                    header_names = tuple(str(value) for value in header_values)
+
+                    selected = {}
+                    for target_col, kind in columns.items():
+                        match, _ = resolve_header(sheet_platform(sheet_name), header_names, target_col)
+                        if match is not None:
+                            selected.setdefault(header_names.index(match) + 1, kind)
+                    letters = {get_column_letter(c_idx).encode(): c_idx for c_idx in selected}
+                    data = {c_idx: {} for c_idx in selected}
+                    decoded = {c_idx: {} for c_idx in selected}
+                    if not letters:
+                        break
+                    data_cell = re.compile(rb'<c r="(' + b'|'.join(letters) + rb')(\d+)"([^>]*?)(?:/>|>(.*?)</c>)', re.S)
+
+                # Promo names and dates repeat down their columns, so each distinct cell is decoded once
+                for column_letters, row_number, attributes, content in data_cell.findall(block):
+                    position = int(row_number) - PWP_HEADER_ROW - 1
+                    if position >= 0:
+                        c_idx = letters[column_letters]
+                        cell = (attributes, content)
+                        if cell not in decoded[c_idx]:
+                            decoded[c_idx][cell] = sheet_cell_value(attributes, content, epoch, selected[c_idx] == 'datetime')
+                        data[c_idx][position] = decoded[c_idx][cell]
+
+        if header is None:
+            raise ValueError("the sheet has no header row")
+        shared = shared_strings_at(workbook_zip, shared_strings, {value[0] for cells in data.values()
+                                                                  for value in cells.values() if isinstance(value, tuple)})
+
+    # Trailing blank rows are dropped, same as read_pwp_columns
+    row_count = max([position + 1 for cells in data.values() for position, value in cells.items()
+                     if value is not None and value != ''], default=0)
+    frame = {}
+    for c_idx in sorted(data):
+        values = [None] * row_count
+        for position, value in data[c_idx].items():
+            if position < row_count:
+                values[position] = shared[value[0]] if isinstance(value, tuple) else value
+        frame[header_values[c_idx - 1]] = type_pwp_column(values, selected[c_idx])
+    return pd.DataFrame(frame)
+
+
+# Parses started in the background as soon as a file is picked, keyed by what they read. The PWP
+# and TB caches are shared by the UI, prefetch and processing threads, so they change under cache_lock
+prefetches = {}
+prefetch_executor = None
+cache_lock = threading.RLock()
+
+
+def prefetch(key, function, *args):
+    global prefetch_executor
+    with cache_lock:
+        if key not in prefetches:
+            if prefetch_executor is None:
+                prefetch_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="prefetch")
+            prefetches[key] = prefetch_executor.submit(function, *args)
+        return prefetches[key]
+
+
+def prefetched(key, function, *args):
+    # Picks up a prefetch that is finished or still running, otherwise does the read here
+    with cache_lock:
+        future = prefetches.get(key)
+    if future is None or future.cancelled():
+        future = prefetch_result(key, function, *args)
+    return future.result()
+
+
+def prefetch_result(key, function, *args):
+    future = Future()
+    with cache_lock:
+        if key in prefetches and not prefetches[key].cancelled():
+            return prefetches[key]
+        prefetches[key] = future
+    try:
+        future.set_result(function(*args))
+    except BaseException as e:
+        future.set_exception(e)
+        with cache_lock:
+            if prefetches.get(key) is future:
+                del prefetches[key]
+    return future
+
+
+def drop_prefetches(kind, file_path):
+    file_key = os.path.abspath(file_path)
+    with cache_lock:
+        for key in [key for key in prefetches if key[:2] == (kind, file_key)]:
+            # A parse that already started cannot be stopped, its result is just not kept
+            prefetches.pop(key).cancel()
+
+
+def pwp_cache_key(pwp_file_path, sheet_name):
+    stat = os.stat(pwp_file_path)
+    return (os.path.abspath(pwp_file_path), sheet_name, stat.st_size, stat.st_mtime_ns)
+
+
+def read_pwp_sheet(pwp_file_path, sheet_name):
+    report_progress('Reading PWP')
+    cache_key = pwp_cache_key(pwp_file_path, sheet_name)
+
+    with cache_lock:
+        if cache_key in pwp_cache:
+            pwp_cache.move_to_end(cache_key)
+            pwp_df = pwp_cache[cache_key][0]
+            record_rows(len(pwp_df))
+            return pwp_df.copy(deep=False)
+
+    try:
+        pwp_df = prefetched(('pwp',) + cache_key, load_pwp_sheet, pwp_file_path, sheet_name, cache_key)
+        record_rows(len(pwp_df))
+    finally:
+        # The sheet now lives in pwp_cache, or failed and should be read again next time
+        with cache_lock:
+            prefetches.pop(('pwp',) + cache_key, None)
+    # The processors select rows and replace whole columns but never write into the sheet, so every caller
+    # gets its own frame over the cached column data
+    return pwp_df.copy(deep=False)
+
+
+def prefetch_pwp_sheet(pwp_file_path, sheet_name):
+    cache_key = pwp_cache_key(pwp_file_path, sheet_name)
+    return prefetch(('pwp',) + cache_key, load_pwp_sheet, pwp_file_path, sheet_name, cache_key)
+
+
+def drop_pwp_sheets(pwp_file_path):
+    drop_prefetches('pwp', pwp_file_path)
+    drop_prefetches('promos', pwp_file_path)
+    file_key = os.path.abspath(pwp_file_path)
+    with cache_lock:
+        for key in [key for key in pwp_cache if key[0] == file_key]:
+            del pwp_cache[key]
+
+
+def load_pwp_sheet(pwp_file_path, sheet_name, cache_key):
+    # A PWP master that was opened before, even in an earlier session, loads from the on-disk cache
+    content_hash = None
+    pwp_df = None
+    if pa is not None:
+        try:
+            content_hash = file_content_hash(pwp_file_path)
+            pwp_df = load_cached_pwp_sheet(content_hash, sheet_name)
+        except Exception as e:
+            logger.warning("PWP disk cache unavailable: %s", e)
+
+    if pwp_df is None:
+        pwp_df = read_pwp_columns(pwp_file_path, sheet_name, PWP_SHEET_COLUMNS[sheet_name])
+        if content_hash:
+            try:
+                store_pwp_sheet(content_hash, sheet_name, pwp_df)
+            except Exception as e:
+                logger.warning("Could not write the PWP disk cache: %s", e)
+
+    # Drop older versions of the same sheet, then evict until we are under the caps. A parse that was still running
+    # when its PWP was dropped is not kept
+    with cache_lock:
+        if ('pwp',) + cache_key not in prefetches:
+            return pwp_df
+        for key in [key for key in pwp_cache if key[:2] == cache_key[:2]]:
+            del pwp_cache[key]
+        pwp_cache[cache_key] = (pwp_df, int(pwp_df.memory_usage(deep=True).sum()))
+        while len(pwp_cache) > 1 and (len(pwp_cache) > PWP_CACHE_MAX_ENTRIES or
+                                      sum(size for _, size in pwp_cache.values()) > PWP_CACHE_MAX_BYTES):
+            pwp_cache.popitem(last=False)
+
+    return pwp_df
+
+
+class TbDocument:
+    # The first sheet of a TB workbook, parsed once and shared by validation, prefetch and the processors.
+    # The raw cells serve the description and header rows; typed frames of the rows below a header row are
+    # built from them the way pd.read_excel types a sheet, once per header row
+    def __init__(self, path, cells):
+        self.path = path
+        self.cells = cells
+        self.frames = {}
+
+    def row(self, row_number):
+        # Cells of a 1-based row with None for blanks, [] past the end of the sheet
+        if row_number > len(self.cells):
+            return []
+        return [None if value == '' else value for value in self.cells[row_number - 1]]
+
+    def rows(self, row_count):
+        return [self.row(row_number) for row_number in range(1, min(row_count, len(self.cells)) + 1)]
+
+    def headers(self, row_number):
+        return [value for value in self.row(row_number) if value is not None]
+
+    def frame(self, header=0, dtype=None):
+        # header is the 0-based header row as pd.read_excel takes it. Every caller gets its own frame over the
+        # shared column data, which the processors replace column by column rather than write into
+        report_progress('Reading TB')
+        frame_key = (header, dtype)
+        if frame_key not in self.frames:
+            if self.cells:
+                self.frames[frame_key] = TextParser(self.cells, header=header, dtype=dtype, skip_blank_lines=False).read()
+            else:
+                self.frames[frame_key] = pd.DataFrame()
+        record_rows(len(self.frames[frame_key]))
+        return self.frames[frame_key].copy(deep=False)
+
+
+def tb_document_key(tb_file_path):
+    stat = os.stat(tb_file_path)
+    return ('tb', os.path.abspath(tb_file_path), stat.st_size, stat.st_mtime_ns)
+
+
+def load_tb_document(tb_file_path):
+    # Cells keep their Excel types, blanks are '' as pandas' Excel readers hand them to the text parser
+    cells = pd.read_excel(tb_file_path, sheet_name=0, header=None, dtype=object, engine=pick_read_engine(tb_file_path))
+    return TbDocument(tb_file_path, cells.where(cells.notna(), '').values.tolist())
+
+
+def open_tb_document(tb_file_path):
+    report_progress('Reading TB')
+    # Picks up the document parsed when the TB was picked; a TB changed on disk since is parsed again
+    key = tb_document_key(tb_file_path)
+    with cache_lock:
+        for stale_key in [stale_key for stale_key in prefetches if stale_key[:2] == key[:2] and stale_key != key]:
+            prefetches.pop(stale_key).cancel()
+    tb = prefetched(key, load_tb_document, tb_file_path)
+    record_rows(len(tb.cells))
+    return tb
+
+
+def prefetch_tb_document(tb_file_path):
+    return prefetch(tb_document_key(tb_file_path), load_tb_document, tb_file_path)
+
+
+def drop_tb_document(tb_file_path):
+    drop_prefetches('tb', tb_file_path)
+
+
+# Promo dropdown entry that writes one output per promo in the campaign list
+ALL_PROMOS = "All Promos"
+
+# State of an all-promos run: the promo being written, the promo groups of the campaign list and each promo's
+# output file name
+promo_run = None
+
+
+def promo_name_keys(promo_names, normalize):
+    # Names as select_promo_rows compares them. A categorical column is normalized once per distinct name
+    if not normalize:
+        return promo_names
+    if not isinstance(promo_names.dtype, pd.CategoricalDtype):
+        return promo_names.astype(str).str.strip().str.lower()
+    names = promo_names.cat.categories.astype(str).str.strip().str.lower()
+    # Blank names have code -1 and pick the 'nan' after the categories, the way str() spells them
+    names = np.append(names.to_numpy(dtype=object), 'nan')[promo_names.cat.codes.to_numpy()]
+    return pd.Series(names, index=promo_names.index, name=promo_names.name)
+
+
+def normalize_ids(values):
+    # IDs as they are matched: stripped, upper-cased text with blanks spelled 'NAN'
+    if ID_DTYPE is None or len(values) < ARROW_IDS_MIN_ROWS:
+        return values.astype(str).mask(values.isna(), 'nan').str.strip().str.upper()
+    return values.astype(ID_DTYPE).fillna('nan').str.strip().str.upper()
+
+
+def ids_as_text(values):
+    # IDs as they are written out: text, with blanks left blank so they are empty cells rather than the text 'nan'
+    return values.where(values.isna(), values.astype(str))
+
+
+def select_promo_rows(pwp_df, promo_name_col, selected_promo, normalize=False, promo_index=None):
+    report_progress('Filtering promo', len(pwp_df))
+    # With normalize names are compared stripped and lower-cased, and the rows carry the normalized name.
+    # Rows are taken by position, so the processors get a frame of their own to replace columns in
+    positions = promo_index.rows_of(selected_promo, normalize) if promo_index is not None else None
+    if positions is not None and positions.size and positions[-1] < len(pwp_df) and (
+            promo_name_keys(pwp_df[promo_name_col].take(positions), normalize) == selected_promo).all():
+        # The index points straight at the promo's rows; should they hold another promo the sheet was read
+        # with a different layout and the names are compared instead
+        promo_rows = pwp_df.take(positions)
+    elif promo_run is None:
+        promo_rows = pwp_df.take(np.flatnonzero(promo_name_keys(pwp_df[promo_name_col], normalize) == selected_promo))
+    else:
+        # The campaign list is grouped once per run and each promo picks its rows by position
+        group_key = (promo_name_col, normalize)
+        if group_key not in promo_run['groups']:
+            promo_names = promo_name_keys(pwp_df[promo_name_col], normalize)
+            promo_run['groups'][group_key] = promo_names.groupby(promo_names, sort=False, observed=True).indices
+        promo_rows = pwp_df.take(promo_run['groups'][group_key].get(selected_promo, []))
+    if normalize:
+        promo_rows = promo_rows.assign(**{promo_name_col: selected_promo})
+    return promo_rows
+
+
+class PromoIndex:
+    # Distinct promos of a campaign sheet in order of first appearance, with the positions of their rows in the
+    # frame read_pwp_sheet returns, their row count and their window from the earliest Date Start to the latest
+    # Date End
+    def __init__(self, names, starts, ends):
+        names = names.dropna()
+        groups = names.groupby(names, sort=False, observed=True)
+        self.positions = {str(name): names.index[indices].to_numpy() for name, indices in groups.indices.items()}
+        self.summary = pd.DataFrame({
+            'rows': groups.size(),
+            'start': starts.reindex(names.index).groupby(names, sort=False, observed=True).min(),
+            'end': ends.reindex(names.index).groupby(names, sort=False, observed=True).max()
+        })
+        self.summary.index = self.summary.index.astype(str)
+        self.summary = self.summary.loc[list(self.positions)]
+
+    def names(self):
+        return list(self.positions)
+
+    def rows_of(self, selected_promo, normalize=False):
+        # Positions of the promo's rows in sheet order; with normalize those of every name that strips and
+        # lower-cases to selected_promo
+        if not normalize:
+            return self.positions.get(selected_promo, np.empty(0, dtype=np.intp))
+        matches = [positions for name, positions in self.positions.items() if name.strip().lower() == selected_promo]
+        return np.sort(np.concatenate(matches)) if matches else np.empty(0, dtype=np.intp)
+
+    def describe(self, promo):
+        # One line for the promo dropdown: a promo's row count and date window, or the whole sheet's for All Promos
+        if promo == ALL_PROMOS:
+            return f"{len(self.summary)} promos, {int(self.summary['rows'].sum()):,} rows"
+        if promo not in self.summary.index:
+            return ""
+        details = self.summary.loc[promo]
+        window = " to ".join(f"{date:%Y-%m-%d}" if pd.notna(date) else "?" for date in (details['start'], details['end']))
+        return f"{int(details['rows']):,} rows, {window}"
+
+
+def promo_index_key(pwp_file_path, sheet_name):
+    return ('promos',) + pwp_cache_key(pwp_file_path, sheet_name)
+
+
+def load_promo_index(pwp_file_path, sheet_name):
+    report_progress('Reading PWP')
+    try:
+        promo_df = scan_sheet_columns(pwp_file_path, sheet_name, PROMO_INDEX_COLUMNS)
+    except (ValueError, KeyError, zipfile.BadZipFile) as e:
+        # Layouts the scan does not handle, and a missing sheet, go through the regular reader
+        logger.info("Reading the promo index of '%s' with the sheet reader: %s", sheet_name, e)
+        promo_df = read_pwp_columns(pwp_file_path, sheet_name, PROMO_INDEX_COLUMNS)
+    record_rows(len(promo_df))
+
+    platform = sheet_platform(sheet_name)
+    promo_name_col = resolve_column(platform, promo_df, 'Promo Name (Scheme)')
+    if promo_name_col is None:
+        raise ValueError(f"No promo name column in '{sheet_name}'")
+    no_dates = pd.Series(pd.NaT, index=promo_df.index, dtype='datetime64[ns]')
+    date_start_col = resolve_column(platform, promo_df, 'Date Start')
+    date_end_col = resolve_column(platform, promo_df, 'Date End')
+    return PromoIndex(promo_df[promo_name_col], promo_df[date_start_col] if date_start_col else no_dates,
+                      promo_df[date_end_col] if date_end_col else no_dates)
+
+
+def read_promo_index(pwp_file_path, sheet_name):
+    # Built once per file version and kept until the PWP is dropped; a PWP changed on disk since is read again
+    key = promo_index_key(pwp_file_path, sheet_name)
+    with cache_lock:
+        for stale_key in [stale_key for stale_key in prefetches if stale_key[:3] == key[:3] and stale_key != key]:
+            prefetches.pop(stale_key).cancel()
+    try:
+        return prefetched(key, load_promo_index, pwp_file_path, sheet_name)
+    except Exception:
+        # A failed read is not kept, picking the file again reads it again
+        with cache_lock:
+            future = prefetches.get(key)
+            if future is not None and future.done() and not future.cancelled() and future.exception() is not None:
+                del prefetches[key]
+        raise
+
+
+def prefetch_promo_index(pwp_file_path, sheet_name):
+    return prefetch(promo_index_key(pwp_file_path, sheet_name), load_promo_index, pwp_file_path, sheet_name)
+
+
+def loaded_promo_index(pwp_file_path, sheet_name):
+    # The promo index if one was already built for this version of the sheet, say for the dropdown, else None
+    with cache_lock:
+        future = prefetches.get(promo_index_key(pwp_file_path, sheet_name))
+    if future is None or not future.done() or future.cancelled() or future.exception() is not None:
+        return None
+    return future.result()
+
+
+def read_promo_names(pwp_file_path, sheet_name):
+    return read_promo_index(pwp_file_path, sheet_name).names()
+
+
+def output_file_path(save_dir, tb_file_path):
+    file_name = "Updated_" + os.path.basename(tb_file_path)
+    if promo_run is not None:
+        # Promos whose names only differ in characters a file name cannot hold, or in case, are numbered so
+        # none overwrites another's output
+        if promo_run['promo'] not in promo_run['file_names']:
+            stem, ext = os.path.splitext(file_name)
+            promo_name = re.sub(r'[\\/:*?"<>|]+', '_', str(promo_run['promo'])).strip()
+            taken = {name.casefold() for name in promo_run['file_names'].values()}
+            file_name, number = f"{stem} - {promo_name}{ext}", 1
+            while file_name.casefold() in taken:
+                number += 1
+                file_name = f"{stem} - {promo_name}_{number}{ext}"
+            promo_run['file_names'][promo_run['promo']] = file_name
+        file_name = promo_run['file_names'][promo_run['promo']]
+    return os.path.join(save_dir, file_name)
 
 
 def open_file_directory(file_path):
     webbrowser.open(f'file:///{os.path.dirname(file_path)}')
 
 
+# Processor messages are collected here instead of shown as dialogs while a batch job runs
+batch_messages = None
+
+# The GUI run on its worker thread: the thread, its cancel flag and the events queued for the UI thread
+gui_run = None
+
+# How far along a processor is when it reaches each stage
+PROGRESS_STAGES = {'Reading TB': 0.1, 'Reading PWP': 0.3, 'Resolving headers': 0.45, 'Filtering promo': 0.5, 'Matching': 0.55,
+                   'Building workbook': 0.6, 'Autofit': 0.65, 'Saving': 0.9}
+
+
+class ProcessingCancelled(BaseException):
+    # Not an Exception, so the processors' broad except blocks let it through
+    pass
+
+
+def on_worker_thread():
+    return gui_run is not None and threading.current_thread() is gui_run['thread']
+
+
+# Called with each stage name as a processor reaches it, e.g. by the benchmark suite
+stage_listeners = []
+
+
+def report_progress(stage, rows=None):
+    # rows is how many rows the stage works on, when that is known as it starts
+    for listener in stage_listeners:
+        listener(stage)
+    record_stage(stage, rows)
+    # Also the point where a cancelled run stops
+    if not on_worker_thread():
+        return
+    if gui_run['cancel'].is_set():
+        raise ProcessingCancelled()
+    fraction = PROGRESS_STAGES.get(stage, 0)
+    if promo_run is not None and promo_run.get('count'):
+        fraction = (promo_run['index'] + fraction) / promo_run['count']
+        stage = f"{stage}: {promo_run['promo']}"
+    gui_run['events'].put(('progress', stage, fraction))
+
+
+# Where each run appends one JSON line with its stage timings. GDEC_TRACE_MEMORY=1 adds peak traced memory per stage,
+# which makes runs several times slower, and GDEC_PROFILE=1 dumps a cProfile of every run
+RUN_LOG = {
+    'path': os.environ.get("GDEC_RUN_LOG") or os.path.join(APP_DATA_DIR, "run_log.jsonl"),
+    'trace_memory': bool(os.environ.get("GDEC_TRACE_MEMORY")),
+    'profile': bool(os.environ.get("GDEC_PROFILE"))
+}
+
+# Stage timings of the run in progress on this process
+run_record = None
+
+
+def record_stage(stage, rows=None):
+    if run_record is None or threading.current_thread() is not run_record['thread']:
+        return
+    if stage != run_record['stage']:
+        finish_stage()
+        run_record.update(stage=stage, stage_start=time.perf_counter())
+    if rows is not None:
+        run_record['rows'][stage] = max(run_record['rows'].get(stage, 0), rows)
+
+
+def record_rows(rows):
+    # Rows a stage worked on, for stages that only know it once they are done
+    if run_record is not None and run_record['stage'] and threading.current_thread() is run_record['thread']:
+        run_record['rows'][run_record['stage']] = max(run_record['rows'].get(run_record['stage'], 0), rows)
+
+
+def finish_stage():
+    stage = run_record['stage']
+    if stage is None:
+        return
+    # A stage reached several times, e.g. once per sheet, adds up to one entry
+    totals = run_record['stages'].setdefault(stage, {'stage': stage, 'seconds': 0.0})
+    totals['seconds'] = round(totals['seconds'] + time.perf_counter() - run_record['stage_start'], 4)
+    if tracemalloc.is_tracing():
+        peak = tracemalloc.get_traced_memory()[1]
+        totals['peak_traced_bytes'] = max(totals.get('peak_traced_bytes', 0), peak)
+        run_record['peak_traced_bytes'] = max(run_record['peak_traced_bytes'], peak)
+        tracemalloc.reset_peak()
+    run_record['stage'] = None
+
+
+def run_instrumented(details, function, *args):
+    global run_record
+
+    run_record = {'thread': threading.current_thread(), 'stage': None, 'stage_start': None, 'stages': {}, 'rows': {},
+                  'peak_traced_bytes': 0}
+    started = datetime.datetime.now()
+    start = time.perf_counter()
+    tracing = RUN_LOG['trace_memory'] and not tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.start()
+    profiler = cProfile.Profile() if RUN_LOG['profile'] else None
+    status = 'finished'
+    try:
+        if profiler:
+            profiler.enable()
+        return function(*args)
+    except BaseException as e:
+        status = type(e).__name__
+        raise
+    finally:
+        if profiler:
+            profiler.disable()
+        finish_stage()
+        entry = dict(details, started=started.isoformat(timespec='seconds'), status=status,
+                     seconds=round(time.perf_counter() - start, 4),
+                     peak_traced_bytes=run_record['peak_traced_bytes'] if tracemalloc.is_tracing() else None,
+                     stages=[dict(stage, rows=run_record['rows'].get(name)) for name, stage in run_record['stages'].items()])
+        run_record = None
+        if tracing:
+            tracemalloc.stop()
+        try:
+            if profiler:
+                entry['profile'] = os.path.join(os.path.dirname(RUN_LOG['path']), "profiles",
+                                                f"{started:%Y%m%d-%H%M%S-%f}-{os.getpid()}.prof")
+                os.makedirs(os.path.dirname(entry['profile']), exist_ok=True)
+                profiler.dump_stats(entry['profile'])
+            os.makedirs(os.path.dirname(RUN_LOG['path']) or '.', exist_ok=True)
+            with open(RUN_LOG['path'], 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, default=str) + "\n")
+        except OSError as e:
+            logger.warning("Could not write the run log: %s", e)
+
+
+def run_on_ui_thread(function, *args):
+    if on_worker_thread():
+        gui_run['events'].put(('call', function, args))
+    else:
+        function(*args)
+
+
+def show_error(message):
+    if batch_messages is not None:
+        batch_messages.append({'level': 'error', 'message': message})
+    else:
+        run_on_ui_thread(messagebox.showerror, "Error", message)
+
+
+def show_info(title, message):
+    if batch_messages is not None:
+        batch_messages.append({'level': 'info', 'message': message})
+    else:
+        run_on_ui_thread(messagebox.showinfo, title, message)
+
+
+def reveal_output(file_path):
+    if batch_messages is None:
+        run_on_ui_thread(open_file_directory, file_path)
+
+
 def create_button(tab, text, command):
     return ctk.CTkButton(tab, text=text, command=command)
 
@@ -28,6 +1138,8 @@ def create_tab(tabview, tab_name, regular_function, manual_function, promo_sheet
     save_dir = StringVar()
     selected_promo = StringVar(value="Required Field")
     is_manual = BooleanVar(value=False)
+    pending_pwp_file = [None]
+    pending_tb_file = [None]
 
     expected_headers = {
         "Lazada": {
@@ -53,20 +1165,39 @@ def create_tab(tabview, tab_name, regular_function, manual_function, promo_sheet
 
     def select_tb_file():
         file_path = filedialog.askopenfilename(title="Select the TB file", filetypes=[("Excel files", "*.xlsx")])
+        try:
+            loading = prefetch_tb_document(file_path)
+        except Exception as e:
+            messagebox.showerror("Error", f"Please select a {tab_name} TB file.")
+            return
+
+        # The TB is parsed in the background; its headers are checked once it is ready
+        if pending_tb_file[0] and pending_tb_file[0] != file_path:
+            drop_tb_document(pending_tb_file[0])
+        pending_tb_file[0] = file_path
+        tb_label.configure(text="Loading...")
+        wait_for_prefetch(loading, tb_file_loaded, file_path)
+
+    def tb_file_loaded(file_path):
+        if pending_tb_file[0] != file_path:
+            # Another file was picked while this one was loading
+            return
+        tb_label.configure(text=f"{os.path.basename(tb_file_path.get())}" if tb_file_path.get() else "Not Selected")
         platform_headers = expected_headers[tab_name]
         if validate_tb_file(file_path, platform_headers):
+            if tb_file_path.get() and tb_file_path.get() != file_path:
+                drop_tb_document(tb_file_path.get())
             tb_file_path.set(file_path)
             tb_label.configure(text=f"{os.path.basename(file_path)}")
         else:
+            drop_tb_document(file_path)
             messagebox.showerror("Error", f"Please select a {tab_name} TB file.")
 
     def validate_tb_file(file_path, platform_headers):
         try:
-            if tab_name == "TikTok" and not is_manual.get():
-                tb_df = pd.read_excel(file_path, sheet_name=0, header=1)
-            else:
-                tb_df = pd.read_excel(file_path, sheet_name=0)
-            tb_headers = list(tb_df.columns)
+            # The document parsed in the background is the one the processor gets
+            header_row = 2 if tab_name == "TikTok" and not is_manual.get() else 1
+            tb_headers = open_tb_document(file_path).headers(header_row)
             if is_manual.get():
                 return set(platform_headers["manual"]).issubset(tb_headers)
             else:
@@ -77,16 +1208,45 @@ def create_tab(tabview, tab_name, regular_function, manual_function, promo_sheet
     def select_pwp_file():
         file_path = filedialog.askopenfilename(title="Select the PWP file", filetypes=[("Excel files", "*.xlsx")])
         try:
-            xl = pd.ExcelFile(file_path)
-            if promo_sheet_name not in xl.sheet_names:
-                messagebox.showerror("Error", "Please select the correct PWP file")
-                return
+            loading = prefetch_promo_index(file_path, promo_sheet_name)
         except Exception as e:
             messagebox.showerror("Error", "Please select the PWP file first")
             return
 
+        # Only the promo names and dates are read first; the file is checked and the promos listed once they are,
+        # and the rest of the sheet is parsed in the background while a promo is picked. The selected PWP keeps its
+        # caches until another file is accepted in its place
+        pending_pwp_file[0] = file_path
+        pwp_label.configure(text="Loading...")
+        wait_for_prefetch(loading, pwp_file_loaded, file_path)
+
+    def wait_for_prefetch(future, callback, *args):
+        if future.done():
+            callback(*args)
+        else:
+            tab.after(100, wait_for_prefetch, future, callback, *args)
+
+    def pwp_file_loaded(file_path):
+        if pending_pwp_file[0] != file_path:
+            # Another file was picked while this one was loading
+            if file_path not in (pending_pwp_file[0], pwp_file_path.get()):
+                drop_pwp_sheets(file_path)
+            return
+        pwp_label.configure(text=f"{os.path.basename(pwp_file_path.get())}" if pwp_file_path.get() else "Not Selected")
+        try:
+            read_promo_index(file_path, promo_sheet_name)
+        except ValueError:
+            messagebox.showerror("Error", "Please select the correct PWP file")
+            return
+        except Exception as e:
+            messagebox.showerror("Error", "Please select the PWP file first")
+            return
+
+        if pwp_file_path.get() and pwp_file_path.get() != file_path:
+            drop_pwp_sheets(pwp_file_path.get())
         pwp_file_path.set(file_path)
         pwp_label.configure(text=f"{os.path.basename(file_path)}")
+        prefetch_pwp_sheet(file_path, promo_sheet_name)
         populate_promo_dropdown()
         promo_dropdown.configure(state="normal")
 
@@ -95,29 +1255,30 @@ def create_tab(tabview, tab_name, regular_function, manual_function, promo_sheet
             messagebox.showerror("Error", "Please select the PWP file first.")
             return
 
-        pwp_df = pd.read_excel(pwp_file_path.get(), sheet_name=promo_sheet_name, header=None)
-        pwp_df.columns = pwp_df.iloc[5]
-        pwp_df = pwp_df.drop(5)
-
-        promo_name_col = 'Promo Name (Scheme)'
-        promo_names = pwp_df[promo_name_col].dropna().unique()
-
-        # Convert all promo names to strings and drop NaN values
-        promo_names = [str(name) for name in promo_names if pd.notna(name)]
+        promo_names = read_promo_names(pwp_file_path.get(), promo_sheet_name)
 
         if promo_names:
             selected_promo.set(promo_names[0])
             promo_dropdown.set(promo_names[0])
-            promo_dropdown.configure(values=promo_names)
+            promo_dropdown.configure(values=promo_names + [ALL_PROMOS])
+            show_promo_details(promo_names[0])
         else:
             messagebox.showerror("Error", "No valid promo names found in the PWP file.")
 
+    def show_promo_details(promo):
+        promo_index = loaded_promo_index(pwp_file_path.get(), promo_sheet_name) if pwp_file_path.get() else None
+        promo_details_label.configure(text=promo_index.describe(promo) if promo_index else "")
+
     def select_save_dir():
         directory = filedialog.askdirectory(title="Select the directory to save the updated file")
         save_dir.set(directory)
         save_dir_label.configure(text=f"{directory}")
 
     def process_files():
+        if gui_run is not None:
+            messagebox.showerror("Error", "Another file is still being processed. Please wait or cancel it first.")
+            return
+
         if not tb_file_path.get() or not pwp_file_path.get() or not save_dir.get() or not selected_promo.get() or selected_promo.get() == "Required Field":
             messagebox.showerror("Error", "Please select all files, directories, and promo.")
             return
@@ -137,11 +1298,72 @@ def create_tab(tabview, tab_name, regular_function, manual_function, promo_sheet
                                  f"Updated TB file is open: {os.path.basename(updated_tb_file_path)}. Please close it before proceeding.")
             return
 
-        if is_manual.get():
-            manual_function(tb_file_path.get(), pwp_file_path.get(), save_dir.get(), selected_promo.get())
+        function = manual_function if is_manual.get() else regular_function
+        if selected_promo.get() == ALL_PROMOS:
+            run_in_background(tb_file_path.get(), process_all_promos, pwp_file_path.get(), save_dir.get(),
+                              promo_sheet_name, function)
         else:
-            regular_function(tb_file_path.get(), pwp_file_path.get(), save_dir.get(), selected_promo.get())
-        adjust_columns(save_dir.get(), updated_tb_file_path)
+            run_in_background(tb_file_path.get(), function, pwp_file_path.get(), save_dir.get(), selected_promo.get())
+
+    def run_in_background(tb_path, function, *args):
+        global gui_run
+
+        # The processor runs on a worker thread and hands progress and dialogs back through the queue
+        events = queue.Queue()
+
+        def work():
+            try:
+                run_instrumented({'source': 'gui', 'function': function.__name__, 'tb': tb_path}, process_tb_file, tb_path,
+                                 function, *args)
+            except ProcessingCancelled:
+                events.put(('cancelled',))
+            except Exception as e:
+                logger.exception("An unexpected error occurred: %s", e)
+                events.put(('call', messagebox.showerror, ("Error", f"An unexpected error occurred: {e}")))
+            finally:
+                drop_tb_document(tb_path)
+                events.put(('done',))
+
+        gui_run = {'thread': threading.Thread(target=work, daemon=True), 'cancel': threading.Event(), 'events': events}
+        process_button.configure(state="disabled")
+        cancel_button.configure(state="normal")
+        progress_bar.set(0)
+        progress_label.configure(text="Starting")
+        gui_run['thread'].start()
+        tab.after(100, poll_events, events)
+
+    def poll_events(events):
+        while True:
+            try:
+                event = events.get_nowait()
+            except queue.Empty:
+                break
+            if event[0] == 'progress':
+                progress_label.configure(text=event[1])
+                progress_bar.set(event[2])
+            elif event[0] == 'call':
+                event[1](*event[2])
+            elif event[0] == 'cancelled':
+                progress_label.configure(text="Cancelled")
+            elif event[0] == 'done':
+                finish_run()
+                return
+        tab.after(100, poll_events, events)
+
+    def cancel_processing():
+        if gui_run is not None:
+            gui_run['cancel'].set()
+            progress_label.configure(text="Cancelling...")
+
+    def finish_run():
+        global gui_run
+        cancelled = gui_run['cancel'].is_set()
+        gui_run = None
+        process_button.configure(state="normal")
+        cancel_button.configure(state="disabled")
+        progress_bar.set(0 if cancelled else 1)
+        if not cancelled:
+            progress_label.configure(text="Done")
 
         # Reset the selections after processing
         tb_file_path.set("")
@@ -153,26 +1375,7 @@ def create_tab(tabview, tab_name, regular_function, manual_function, promo_sheet
         save_dir_label.configure(text="Not Selected")
         promo_dropdown.configure(state="disabled", values=[])
         promo_dropdown.set("Select Promo")
-
-    def adjust_columns(save_dir, updated_tb_file_path):
-        df = pd.read_excel(updated_tb_file_path, sheet_name=None)
-
-        with pd.ExcelWriter(updated_tb_file_path, engine='openpyxl') as writer:
-            for sheet_name, sheet_df in df.items():
-                sheet_df.replace({pd.NA: '', pd.NaT: '', 'NAN': ''}, inplace=True)
-                sheet_df.to_excel(writer, sheet_name=sheet_name, index=False)
-                worksheet = writer.sheets[sheet_name]
-                for col in worksheet.columns:
-                    max_length = 0
-                    column = col[0].column_letter
-                    for cell in col:
-                        try:
-                            if len(str(cell.value)) > max_length:
-                                max_length = len(str(cell.value))
-                        except:
-                            pass
-                    adjusted_width = (max_length + 2)
-                    worksheet.column_dimensions[column].width = adjusted_width
+        promo_details_label.configure(text="")
 
     tb_button = create_button(tab, "Select TB File", select_tb_file)
     tb_button.grid(row=0, column=0, padx=10, pady=10, sticky='w')
@@ -191,24 +1394,442 @@ def create_tab(tabview, tab_name, regular_function, manual_function, promo_sheet
 
     promo_label = ctk.CTkLabel(tab, text="Select Promo")
     promo_label.grid(row=3, column=0, padx=10, pady=10, sticky='w')
-    promo_dropdown = ctk.CTkOptionMenu(tab, variable=selected_promo, state="disabled")
-    promo_dropdown.grid(row=3, column=1, padx=10, pady=10, sticky='w', columnspan=2)
+    promo_dropdown = ctk.CTkOptionMenu(tab, variable=selected_promo, state="disabled", command=show_promo_details)
+    promo_dropdown.grid(row=3, column=1, padx=10, pady=10, sticky='w')
+    promo_details_label = ctk.CTkLabel(tab, text="")
+    promo_details_label.grid(row=3, column=2, padx=10, pady=10, sticky='w')
 
     manual_toggle = ctk.CTkCheckBox(tab, text="Manual Process", variable=is_manual)
     manual_toggle.grid(row=4, column=0, padx=10, pady=10, sticky='w')
 
+    progress_bar = ctk.CTkProgressBar(tab)
+    progress_bar.set(0)
+    progress_bar.grid(row=4, column=1, padx=10, pady=10, sticky='ew', columnspan=2)
+    progress_label = ctk.CTkLabel(tab, text="")
+    progress_label.place(relx=0, rely=1, anchor='sw', x=10)
+
+    cancel_button = create_button(tab, "Cancel", cancel_processing)
+    cancel_button.configure(state="disabled")
+    cancel_button.place(relx=1, rely=1, anchor='se', x=-150)
+
     process_button = create_button(tab, "Process File", process_files)
     process_button.place(relx=1, rely=1, anchor='se')
 
     return tab
 
 
-def process_files_generic(tb_file_path, pwp_file_path, save_dir, selected_promo, sheet_name):
-    def find_closest_column(df, target_col):
-        col_names = [str(col) for col in df.columns]
-        matches = get_close_matches(target_col, col_names, n=1, cutoff=0.6)
-        return matches[0] if matches else None
+# Same header look pandas gives to_excel output
+HEADER_FONT = Font(bold=True)
+HEADER_BORDER = Border(left=Side(style='thin'), right=Side(style='thin'), top=Side(style='thin'), bottom=Side(style='thin'))
+HEADER_ALIGNMENT = Alignment(horizontal='center', vertical='top')
+
+
+def clean_output_cell(value):
+    if value is None or value == 'NAN' or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    return value
+
+
+def clean_output_values(df):
+    values = df.astype(object).where(df.notna(), None)
+    return values.mask(values == 'NAN', None)
+
+
+def header_cell(worksheet, value):
+    cell = WriteOnlyCell(worksheet, value)
+    cell.font = HEADER_FONT
+    cell.border = HEADER_BORDER
+    cell.alignment = HEADER_ALIGNMENT
+    return cell
+
+
+def formatted_cell(worksheet, value, number_format):
+    cell = WriteOnlyCell(worksheet, value)
+    cell.number_format = number_format
+    return cell
+
+
+def output_column_widths(rows, values):
+    # Longest text per column across the rows above the data and the data itself
+    widths = {}
+    for row in rows:
+        for c_idx, value in enumerate(row, start=1):
+            if value is not None:
+                widths[c_idx] = max(widths.get(c_idx, 0), len(str(value)))
+    for c_idx, (_, column) in enumerate(values.items(), start=1):
+        lengths = column.dropna().astype(str).str.len()
+        if not lengths.empty:
+            widths[c_idx] = max(widths.get(c_idx, 0), int(lengths.max()))
+    return widths
+
+
+def prepare_output_sheet(sheet):
+    df = sheet['df']
+    report_progress('Building workbook', len(df))
+    values = clean_output_values(df)
+
+    rows = [[clean_output_cell(value) for value in row] for row in sheet.get('preamble', [])]
+    header = sheet.get('header', list(df.columns))
+    if header is not None:
+        rows.append([clean_output_cell(value) for value in header])
+    styled_header = header is not None and sheet.get('header_style', False)
+
+    min_widths = sheet.get('min_widths', {})
+    report_progress('Autofit', len(values))
+    widths = {c_idx: max(width + 2, min_widths.get(get_column_letter(c_idx), 0))
+              for c_idx, width in output_column_widths(rows, values).items()}
+
+    number_formats = {df.columns.get_loc(column_name): number_format
+                      for column_name, number_format in sheet.get('number_formats', {}).items()}
+    return values, rows, styled_header, widths, number_formats
+
+
+# Rows written between cancellation checks
+PROGRESS_ROWS = 10000
+
+
+def write_output_workbook(file_path, sheets, write_only=False):
+    if OUTPUT_MODE == 'template' and len(sheets) == 1 and sheets[0].get('template'):
+        try:
+            write_template_workbook(file_path, sheets[0])
+            return
+        except (ValueError, KeyError, zipfile.BadZipFile) as e:
+            logger.warning("Could not fill a copy of the TB, writing a new workbook instead: %s", e)
+
+    if pick_write_engine(sum(len(sheet['df']) for sheet in sheets)) == 'xlsxwriter':
+        write_output_workbook_xlsxwriter(file_path, sheets)
+        return
+
+    # In write-only mode rows are streamed to the file as they are produced, so every
+    # width, height and format is decided before the first row is written
+    workbook = Workbook(write_only=write_only)
+    if not write_only:
+        workbook.remove(workbook.active)
+
+    prepared_sheets = [prepare_output_sheet(sheet) for sheet in sheets]
+    report_progress('Building workbook')
+    for sheet, (values, rows, styled_header, widths, number_formats) in zip(sheets, prepared_sheets):
+        worksheet = workbook.create_sheet(sheet['name'])
+
+        for c_idx, width in widths.items():
+            worksheet.column_dimensions[get_column_letter(c_idx)].width = width
+        for r_idx, height in sheet.get('row_heights', {}).items():
+            worksheet.row_dimensions[r_idx].height = height
+
+        if styled_header:
+            rows[-1] = [header_cell(worksheet, value) for value in rows[-1]]
+        for row in rows:
+            worksheet.append(row)
+
+        # Number formats are resolved once per column and stamped on that column's cells as rows go out
+        for r_idx, row in enumerate(values.itertuples(index=False, name=None), start=1):
+            if r_idx % PROGRESS_ROWS == 0:
+                report_progress('Building workbook')
+            if number_formats:
+                row = list(row)
+                for c_idx, number_format in number_formats.items():
+                    row[c_idx] = formatted_cell(worksheet, row[c_idx], number_format)
+            worksheet.append(row)
+
+    report_progress('Saving', sum(len(sheet['df']) for sheet in sheets))
+    workbook.save(file_path)
+
+
+def write_output_workbook_xlsxwriter(file_path, sheets):
+    import xlsxwriter
+    from xlsxwriter.exceptions import FileCreateError
+
+    # constant_memory flushes each row as soon as the next one starts
+    workbook = xlsxwriter.Workbook(file_path, {'constant_memory': True, 'strings_to_urls': False,
+                                               'default_date_format': 'yyyy-mm-dd h:mm:ss'})
+    header_format = workbook.add_format({'bold': True, 'border': 1, 'align': 'center', 'valign': 'top'})
+    cell_formats = {}
+
+    prepared_sheets = [prepare_output_sheet(sheet) for sheet in sheets]
+    report_progress('Building workbook')
+    for sheet, (values, rows, styled_header, widths, number_formats) in zip(sheets, prepared_sheets):
+        worksheet = workbook.add_worksheet(sheet['name'])
+
+        for c_idx, width in widths.items():
+            worksheet.set_column(c_idx - 1, c_idx - 1, width)
+        for r_idx, height in sheet.get('row_heights', {}).items():
+            worksheet.set_row(r_idx - 1, height)
+
+        for r_idx, row in enumerate(rows):
+            worksheet.write_row(r_idx, 0, row, header_format if styled_header and r_idx == len(rows) - 1 else None)
+
+        column_formats = {c_idx: cell_formats.setdefault(number_format, workbook.add_format({'num_format': number_format}))
+                          for c_idx, number_format in number_formats.items()}
+        for r_idx, row in enumerate(values.itertuples(index=False, name=None), start=len(rows)):
+            if r_idx % PROGRESS_ROWS == 0:
+                report_progress('Building workbook')
+            worksheet.write_row(r_idx, 0, row)
+            for c_idx, cell_format in column_formats.items():
+                worksheet.write(r_idx, c_idx, row[c_idx], cell_format)
+
+    report_progress('Saving', sum(len(sheet['df']) for sheet in sheets))
+    try:
+        workbook.close()
+    except FileCreateError as e:
+        # Surface a locked output file the same way openpyxl does
+        if e.args and isinstance(e.args[0], OSError):
+            raise e.args[0]
+        raise
+
+
+def template_sheet_part(template_zip):
+    # Path of the workbook's first sheet, the one pd.read_excel reads as sheet 0
+    sheets, _ = workbook_parts(template_zip)
+    if not sheets:
+        raise ValueError("the TB has no worksheet")
+    sheet_part = next(iter(sheets.values()))
+    if sheet_part is None:
+        raise ValueError("the TB's first sheet could not be found")
+    return sheet_part
+
+
+def xml_attributes(tag):
+    return {name.decode(): value.decode() for name, value in re.findall(rb'([\w:]+)="([^"]*)"', tag)}
+
+
+def template_column_styles(sheet_xml, data_row_xml):
+    # Style of each column's cells in the TB's first data row, else the column's default style
+    styles = {}
+    for col in re.findall(rb'<col\b[^>]*>', sheet_xml[:sheet_xml.find(b'<sheetData')]):
+        attributes = xml_attributes(col)
+        if 'style' in attributes:
+            for c_idx in range(int(attributes['min']), min(int(attributes['max']), 16384) + 1):
+                styles[c_idx] = int(attributes['style'])
+    for cell in re.findall(rb'<c\b[^>]*>', data_row_xml):
+        attributes = xml_attributes(cell)
+        if 'r' in attributes and 's' in attributes:
+            styles[column_index_from_string(re.match(r'[A-Z]+', attributes['r']).group(0))] = int(attributes['s'])
+    return styles
+
+
+def add_number_format_styles(styles_xml, requests):
+    # Appends a copy of each (base cell style, number format) with the format applied. Returns the new styles
+    # part and the index of each requested style
+    cell_xfs = re.search(r'<cellXfs\b[^>]*>(.*?)</cellXfs>', styles_xml, re.S)
+    if cell_xfs is None:
+        raise ValueError("the TB has no cell styles")
+    xfs = re.findall(r'<xf\b[^>]*/>|<xf\b[^>]*>.*?</xf>', cell_xfs.group(1), re.S)
+    custom_formats = {code: int(fmt_id) for fmt_id, code in
+                      re.findall(r'<numFmt\b[^>]*?numFmtId="(\d+)"[^>]*?formatCode="([^"]*)"', styles_xml)}
+    new_formats = []
+    new_xfs = []
+    indices = {}
+    for base, number_format in requests:
+        code = escape(number_format, {'"': '&quot;'})
+        fmt_id = BUILTIN_FORMATS_REVERSE.get(number_format, custom_formats.get(code))
+        if fmt_id is None:
+            fmt_id = custom_formats[code] = max([163] + list(custom_formats.values())) + 1
+            new_formats.append(f'<numFmt numFmtId="{fmt_id}" formatCode="{code}"/>')
+        xf = xfs[base] if base < len(xfs) else '<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+        start_tag = re.match(r'<xf\b[^>]*?(?=/?>)', xf).group(0)
+        new_start_tag = re.sub(r'\s(numFmtId|applyNumberFormat)="[^"]*"', '', start_tag)
+        new_xfs.append(xf.replace(start_tag, f'{new_start_tag} numFmtId="{fmt_id}" applyNumberFormat="1"', 1))
+        indices[(base, number_format)] = len(xfs) + len(new_xfs) - 1
+
+    styles_xml = styles_xml[:cell_xfs.end(1)] + ''.join(new_xfs) + styles_xml[cell_xfs.end(1):]
+    styles_xml = re.sub(r'(<cellXfs\b[^>]*?\bcount=")\d+', rf'\g<1>{len(xfs) + len(new_xfs)}', styles_xml, 1)
+    if new_formats:
+        num_fmts = re.search(r'<numFmts\b[^>]*>(.*?)</numFmts>', styles_xml, re.S)
+        if num_fmts:
+            styles_xml = styles_xml[:num_fmts.end(1)] + ''.join(new_formats) + styles_xml[num_fmts.end(1):]
+            styles_xml = re.sub(r'(<numFmts\b[^>]*?\bcount=")\d+', rf'\g<1>{len(custom_formats)}', styles_xml, 1)
+        else:
+            style_sheet = re.search(r'<styleSheet\b[^>]*>', styles_xml)
+            styles_xml = (styles_xml[:style_sheet.end()] + f'<numFmts count="{len(new_formats)}">' +
+                          ''.join(new_formats) + '</numFmts>' + styles_xml[style_sheet.end():])
+    return styles_xml, indices
+
+
+def template_cell_xml(ref, value, style):
+    # Numbers and booleans are written as values, dates as Excel serials and everything else as inline text
+    style = f' s="{style}"' if style else ''
+    if isinstance(value, (bool, np.bool_)):
+        return f'<c r="{ref}"{style} t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, np.integer)):
+        return f'<c r="{ref}"{style}><v>{int(value)}</v></c>'
+    if isinstance(value, (float, np.floating)):
+        return f'<c r="{ref}"{style}><v>{float(value)!r}</v></c>' if np.isfinite(value) else ''
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return f'<c r="{ref}"{style}><v>{to_excel(value)!r}</v></c>'
+    text = escape(ILLEGAL_CHARACTERS_RE.sub('', str(value)))
+    return f'<c r="{ref}"{style} t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def template_rows_xml(values, column_styles, data_row):
+    # XML of the data rows from data_row down, PROGRESS_ROWS rows at a time; cells are built a column at a time
+    for start in range(0, len(values), PROGRESS_ROWS):
+        if start:
+            report_progress('Building workbook')
+        block = values.iloc[start:start + PROGRESS_ROWS]
+        columns = [[template_cell_xml(f'{get_column_letter(c_idx)}{r_idx}', value, column_styles.get(c_idx))
+                    if value is not None else '' for r_idx, value in enumerate(block.iloc[:, c_idx - 1], start=data_row + start)]
+                   for c_idx in range(1, len(values.columns) + 1)]
+        yield ''.join(f'<row r="{r_idx}">{"".join(cells)}</row>'
+                      for r_idx, cells in enumerate(zip(*columns), start=data_row + start)).encode('utf-8')
+
+
+def write_template_workbook(file_path, sheet):
+    # Copies the TB workbook part by part and replaces only the first sheet's rows from data_row down, so the rows
+    # above, styles, validations, column widths and the other sheets stay as the seller's template has them.
+    # The frame's columns are taken to be the TB's own columns in sheet order, as the processors' frames come from it
+    template = sheet['template']
+    df = sheet['df']
+    data_row = template['data_row']
+    report_progress('Building workbook', len(df))
+
+    with zipfile.ZipFile(template['document'].path) as template_zip:
+        sheet_part = template_sheet_part(template_zip)
+        sheet_xml = template_zip.read(sheet_part)
+        sheet_data = re.search(rb'<sheetData\b[^>]*?(/?)>', sheet_xml)
+        if sheet_data is None:
+            raise ValueError("the TB's first sheet has no cell data in the default namespace")
+
+        # Rows before data_row are kept; a row without an r attribute follows the one before it
+        cut = end = sheet_data.end()
+        data_row_xml = b''
+        if not sheet_data.group(1):
+            end = sheet_xml.index(b'</sheetData>', sheet_data.end())
+            row_number = 0
+            for row in re.compile(rb'<row\b([^>]*?)(/?)>').finditer(sheet_xml, sheet_data.end(), end):
+                number = re.search(rb'\br="(\d+)"', row.group(1))
+                row_number = int(number.group(1)) if number else row_number + 1
+                row_end = row.end() if row.group(2) else sheet_xml.index(b'</row>', row.end()) + len(b'</row>')
+                if row_number >= data_row:
+                    if row_number == data_row:
+                        data_row_xml = sheet_xml[row.end():row_end]
+                    break
+                cut = row_end
+
+        column_styles = template_column_styles(sheet_xml, data_row_xml)
+        styles_xml = template_zip.read('xl/styles.xml').decode('utf-8')
+        column_formats = {df.columns.get_loc(column_name) + 1: number_format
+                          for column_name, number_format in sheet.get('number_formats', {}).items()}
+        if column_formats:
+            styles_xml, added = add_number_format_styles(styles_xml, sorted(
+                {(column_styles.get(c_idx, 0), number_format) for c_idx, number_format in column_formats.items()}))
+            for c_idx, number_format in column_formats.items():
+                column_styles[c_idx] = added[(column_styles.get(c_idx, 0), number_format)]
+
+        # The sheet as it goes around the new rows
+        if sheet_data.group(1):
+            head, tail = sheet_xml[:sheet_data.start()] + b'<sheetData>', b'</sheetData>' + sheet_xml[sheet_data.end():]
+        else:
+            head, tail = sheet_xml[:cut], sheet_xml[end:]
+
+        # The used range keeps the template's width and ends at the last row written
+        dimension = re.search(rb'<dimension\b[^>]*?\bref="([^"]*)"', head)
+        if dimension:
+            template_columns = re.findall(rb'([A-Z]+)\d*', dimension.group(1))
+            last_column = max([len(df.columns), 1] + [column_index_from_string(letters.decode()) for letters in template_columns])
+            last_row = max(data_row + len(df) - 1, data_row - 1, 1)
+            head = head[:dimension.start(1)] + f'A1:{get_column_letter(last_column)}{last_row}'.encode() + head[dimension.end(1):]
+
+        values = clean_output_values(df)
+        # The copy is written beside the output and only moved onto it once complete, so a cancelled or failed
+        # write leaves the previous output as it was
+        temp_path = temp_file_path(file_path)
+        try:
+            with zipfile.ZipFile(temp_path, 'w', zipfile.ZIP_DEFLATED) as output_zip:
+                for info in template_zip.infolist():
+                    # The calculation chain may name formula cells of the replaced rows; Excel rebuilds it without one
+                    if info.filename == 'xl/calcChain.xml':
+                        continue
+                    if info.filename == sheet_part:
+                        # The rows are compressed as they are built, so the sheet's XML is never held whole
+                        sheet_info = zipfile.ZipInfo(info.filename, info.date_time)
+                        sheet_info.compress_type = zipfile.ZIP_DEFLATED
+                        with output_zip.open(sheet_info, 'w') as sheet_file:
+                            sheet_file.write(head)
+                            for rows_xml in template_rows_xml(values, column_styles, data_row):
+                                sheet_file.write(rows_xml)
+                            sheet_file.write(tail)
+                        report_progress('Saving', len(df))
+                        continue
+                    if info.filename == 'xl/styles.xml':
+                        data = styles_xml.encode('utf-8')
+                    elif info.filename in ('[Content_Types].xml', 'xl/_rels/workbook.xml.rels'):
+                        data = re.sub(rb'<(Override|Relationship)\b[^>]*calcChain\.xml"[^>]*/>', b'', template_zip.read(info))
+                    else:
+                        data = template_zip.read(info)
+                    output_zip.writestr(info, data, zipfile.ZIP_DEFLATED)
+            os.replace(temp_path, file_path)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.remove(temp_path)
+            raise
+
+
+def parse_prices(prices):
+    # Numbers pass through; text such as "₱1,299.00" loses its currency symbol, separators and spaces.
+    # Returns the prices as floats and a mask of the non-blank values that still are not a number
+    parsed = pd.to_numeric(prices, errors='coerce').astype(float)
+    needs_cleaning = parsed.isna() & prices.notna()
+    unparseable = pd.Series(False, index=prices.index)
+    if needs_cleaning.any():
+        text = prices[needs_cleaning].astype(str)
+        cleaned = pd.to_numeric(text.str.replace(r'[^\d.]+', '', regex=True), errors='coerce')
+        parsed[needs_cleaning] = cleaned
+        unparseable[needs_cleaning] = (cleaned.isna() & (text.str.strip() != '')).to_numpy(dtype=bool)
+        if unparseable.any():
+            logger.info("Unparseable prices in '%s': %s", prices.name, int(unparseable.sum()))
+    return parsed, unparseable
+
+
+@lru_cache(maxsize=64)
+def text_datetime_format(sample):
+    # strptime layout of a date or time text such as "2024-11-11" or "08:00:00", None when it has no single layout
+    return guess_datetime_format(sample)
+
+
+def parse_datetimes(values, default_format):
+    # Excel datetimes and time objects convert natively and Excel serial numbers by day count. Text is parsed with
+    # the layout of the column's first text cell, so a column of one layout converts in a single pass; only
+    # cells in some other layout fall back to pandas' per-cell guessing
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    if pd.api.types.is_numeric_dtype(values):
+        return pd.to_datetime(values, unit='D', origin='1899-12-30', errors='coerce')
+    first_text = next((value.strip() for value in values if isinstance(value, str) and value.strip()), None)
+    text_format = (text_datetime_format(first_text) if first_text else None) or default_format
+    parsed = pd.to_datetime(values, format=text_format, errors='coerce')
+    missing = parsed.isna() & values.notna()
+    if missing.any():
+        leftover = values[missing].astype(str).str.strip()
+        leftover = leftover[leftover != '']
+        if not leftover.empty:
+            parsed[leftover.index] = pd.to_datetime(leftover, format='mixed', errors='coerce')
+    return parsed
+
+
+def combine_date_time(dates, times):
+    # One datetime per row from a date column and a time column of the same rows. A missing time keeps the
+    # date cell's own time of day; rows whose date cannot be read come out as NaT
+    dates = parse_datetimes(dates, '%Y-%m-%d')
+    times = parse_datetimes(times, '%H:%M:%S')
+    days = dates.dt.normalize()
+    return days + (times - times.dt.normalize()).fillna(dates - days)
+
+
+def build_price_lookup(pwp_df, id_col, price_col):
+    report_progress('Matching', len(pwp_df))
+    # First PWP row wins for duplicate IDs, same as taking matching_row.iloc[0]
+    first_rows = pwp_df.dropna(subset=[id_col]).drop_duplicates(subset=[id_col])
+    return pd.Series(first_rows[price_col].values, index=first_rows[id_col].values)
+
+
+def append_pwp_rows(tb_df, pwp_df, column_map):
+    # column_map is {pwp column: tb column}, all PWP rows are appended in a single concat
+    report_progress('Matching', len(pwp_df))
+    new_rows = pwp_df[list(column_map)].rename(columns=column_map)
+    return pd.concat([tb_df, new_rows], ignore_index=True)
+
 
+def process_files_generic(tb_file_path, pwp_file_path, save_dir, selected_promo, sheet_name):
     updated_tb_file_path = os.path.join(save_dir, "Updated_" + os.path.basename(tb_file_path))
 
     tb_df = pd.read_excel(tb_file_path, sheet_name=0)
@@ -229,52 +1850,32 @@ def process_files_generic(tb_file_path, pwp_file_path, save_dir, selected_promo,
         tb_df_shifted.to_excel(writer, sheet_name="TB", index=False)
         pwp_df.to_excel(writer, sheet_name="PWP", index=False)
 
-    messagebox.showinfo("Process Complete", f"Processing complete. Processing complete. Your TB file has been processed. {updated_tb_file_path}.")
-    open_file_directory(updated_tb_file_path)
-
+    show_info("Process Complete", f"Processing complete. Processing complete. Your TB file has been processed. {updated_tb_file_path}.")
+    reveal_output(updated_tb_file_path)
 
-def lazada_process(tb_file_path, pwp_file_path, save_dir, selected_promo):
-    import re
-
-    def find_closest_column(df, target_col):
-        col_names = [str(col) for col in df.columns]
-        matches = get_close_matches(target_col, col_names, n=1, cutoff=0.6)
-        return matches[0] if matches else None
-
-    def clean_price(price_str):
-        cleaned_str = re.sub(r'[^\d.]+', '', price_str)
-        try:
-            return float(cleaned_str)
-        except ValueError:
-            return None
 
-    if not tb_file_path or not pwp_file_path or not save_dir or not selected_promo:
-        messagebox.showerror("Error", "Please select all files, directories, and promo.")
+def lazada_process(tb, pwp_file_path, save_dir, selected_promo):
+    if not tb or not pwp_file_path or not save_dir or not selected_promo:
+        show_error("Please select all files, directories, and promo.")
         return
 
-    updated_tb_file_path = os.path.join(save_dir, "Updated_" + os.path.basename(tb_file_path))
+    updated_tb_file_path = output_file_path(save_dir, tb.path)
 
     if os.path.exists(updated_tb_file_path):
         os.chmod(updated_tb_file_path, 0o777)
 
     try:
-        tb_df = pd.read_excel(tb_file_path, sheet_name=0, header=0)
-    except PermissionError:
-        messagebox.showerror("Error", f"Please close the TB file: {os.path.basename(tb_file_path)} first.")
-        return
+        tb_df = tb.frame(header=0)
     except Exception as e:
-        messagebox.showerror("Error", "Please select correct TB file")
+        show_error("Please select correct TB file")
         return
 
     try:
-        pwp_df = pd.read_excel(pwp_file_path, sheet_name="Lzd | Campaign List", header=None)
+        pwp_df = read_pwp_sheet(pwp_file_path, "Lzd | Campaign List")
     except PermissionError:
-        messagebox.showerror("Error", f"Please close the PWP file: {os.path.basename(pwp_file_path)} first.")
+        show_error(f"Please close the PWP file: {os.path.basename(pwp_file_path)} first.")
         return
 
-    pwp_df.columns = pwp_df.iloc[5]
-    pwp_df = pwp_df.drop(5)
-
     shop_sku_tb_col = 'Shop Sku'
     shop_sku_pwp_col = 'SHOP SKU'
     campaign_price_col = 'Campaign Price'
@@ -282,52 +1883,46 @@ def lazada_process(tb_file_path, pwp_file_path, save_dir, selected_promo):
     discounted_price_col = 'Discounted Price/ASP (VATIN)'
     recommended_price_col = 'Recommended Price'
 
-    shop_sku_tb_col = find_closest_column(tb_df, shop_sku_tb_col) or shop_sku_tb_col
-    shop_sku_pwp_col = find_closest_column(pwp_df, shop_sku_pwp_col) or shop_sku_pwp_col
-    campaign_price_col = find_closest_column(tb_df, campaign_price_col) or campaign_price_col
-    promo_name_col = find_closest_column(pwp_df, promo_name_col) or promo_name_col
-    discounted_price_col = find_closest_column(pwp_df, discounted_price_col) or discounted_price_col
-    recommended_price_col = find_closest_column(tb_df, recommended_price_col) or recommended_price_col
+    shop_sku_tb_col = resolve_column('lazada', tb_df, shop_sku_tb_col)
+    shop_sku_pwp_col = resolve_column('lazada', pwp_df, shop_sku_pwp_col)
+    campaign_price_col = resolve_column('lazada', tb_df, campaign_price_col)
+    promo_name_col = resolve_column('lazada', pwp_df, promo_name_col)
+    discounted_price_col = resolve_column('lazada', pwp_df, discounted_price_col)
+    recommended_price_col = resolve_column('lazada', tb_df, recommended_price_col)
 
     if not all([shop_sku_tb_col, shop_sku_pwp_col, campaign_price_col, promo_name_col, discounted_price_col, recommended_price_col]):
-        messagebox.showerror("Error", "Required columns not found in the TB or PWP file.")
+        show_error("Required columns not found in the TB or PWP file.")
         return
 
-    filtered_pwp_df = pwp_df[pwp_df[promo_name_col] == selected_promo]
+    filtered_pwp_df = select_promo_rows(pwp_df, promo_name_col, selected_promo,
+                                        promo_index=loaded_promo_index(pwp_file_path, "Lzd | Campaign List"))
 
-    tb_df[shop_sku_tb_col] = tb_df[shop_sku_tb_col].astype(str).str.strip().str.upper()
-    filtered_pwp_df.loc[:, shop_sku_pwp_col] = filtered_pwp_df[shop_sku_pwp_col].astype(str).str.strip().str.upper()
+    tb_df[shop_sku_tb_col] = normalize_ids(tb_df[shop_sku_tb_col])
+    filtered_pwp_df[shop_sku_pwp_col] = normalize_ids(filtered_pwp_df[shop_sku_pwp_col])
 
-    good_for_upload_df = tb_df.copy()
+    price_lookup = build_price_lookup(filtered_pwp_df, shop_sku_pwp_col, discounted_price_col)
+    in_pwp = tb_df[shop_sku_tb_col].isin(price_lookup.index)
 
-    platform_df = pd.DataFrame(columns=[shop_sku_tb_col, campaign_price_col, 'Escalation Reason'])
+    # A missing recommended price or a discounted price that does not parse is an invalid price format
+    discounted_price, invalid_discount = parse_prices(tb_df[shop_sku_tb_col].map(price_lookup).rename(discounted_price_col))
+    recommended_price, _ = parse_prices(tb_df[recommended_price_col])
 
-    brand_df = pd.DataFrame(columns=[shop_sku_tb_col, 'Recommended Price'])
+    invalid_price = in_pwp & (recommended_price.isna() | invalid_discount)
+    meets_reco = in_pwp & ~invalid_price & (recommended_price >= discounted_price)
+    below_reco = in_pwp & ~invalid_price & ~meets_reco
 
-    tb_skus_in_pwp = set(filtered_pwp_df[shop_sku_pwp_col].dropna().unique())
+    # The prices go into this run's TB frame, so only the rows that keep a campaign price are copied out of it
+    tb_df[campaign_price_col] = tb_df[campaign_price_col].mask(meets_reco, discounted_price)
+    good_for_upload_df = tb_df.dropna(subset=[campaign_price_col])
 
-    for idx, row in tb_df.iterrows():
-        sku = row[shop_sku_tb_col]
-        if sku in tb_skus_in_pwp:
-            matching_row = filtered_pwp_df[filtered_pwp_df[shop_sku_pwp_col] == sku]
-            if not matching_row.empty:
-                discounted_price = matching_row.iloc[0][discounted_price_col]
-                recommended_price = clean_price(str(row[recommended_price_col]))
-                if isinstance(discounted_price, str):
-                    discounted_price = clean_price(discounted_price)
-                if recommended_price is not None and discounted_price is not None:
-                    if recommended_price >= discounted_price:
-                        good_for_upload_df.at[idx, campaign_price_col] = discounted_price
-                    else:
-                        platform_df = pd.concat([platform_df, pd.DataFrame(
-                            {shop_sku_tb_col: [sku], campaign_price_col: [discounted_price], 'Escalation Reason': ['do not meet the reco price']})], ignore_index=True)
-                else:
-                    platform_df = pd.concat([platform_df, pd.DataFrame(
-                        {shop_sku_tb_col: [sku], campaign_price_col: [discounted_price], 'Escalation Reason': ['invalid price format']})], ignore_index=True)
-        else:
-            brand_df = pd.concat([brand_df, pd.DataFrame({shop_sku_tb_col: [sku], 'Recommended Price': [row['Recommended Price']]})], ignore_index=True)
+    escalated = invalid_price | below_reco
+    platform_df = pd.DataFrame({
+        shop_sku_tb_col: tb_df.loc[escalated, shop_sku_tb_col],
+        campaign_price_col: discounted_price[escalated],
+        'Escalation Reason': invalid_price[escalated].map({True: 'invalid price format', False: 'do not meet the reco price'})
+    })
 
-    good_for_upload_df = good_for_upload_df.dropna(subset=[campaign_price_col])
+    brand_df = tb_df.loc[~in_pwp, [shop_sku_tb_col, recommended_price_col]]
 
     pwp_skus_not_in_tb = filtered_pwp_df[~filtered_pwp_df[shop_sku_pwp_col].isin(tb_df[shop_sku_tb_col])]
     platform_df = pd.concat([platform_df, pwp_skus_not_in_tb[[shop_sku_pwp_col, discounted_price_col]].rename(
@@ -337,64 +1932,40 @@ def lazada_process(tb_file_path, pwp_file_path, save_dir, selected_promo):
     brand_df.columns = ['Shop Sku', 'Recommended Price']
 
     try:
-        with pd.ExcelWriter(updated_tb_file_path, engine='openpyxl') as writer:
-            good_for_upload_df.replace({pd.NA: '', pd.NaT: '', 'NAN': ''}).to_excel(writer, sheet_name="Good for upload", index=False)
-            platform_df.replace({pd.NA: '', pd.NaT: '', 'NAN': ''}).to_excel(writer, sheet_name="Platform", index=False)
-            brand_df.replace({pd.NA: '', pd.NaT: '', 'NAN': ''}).to_excel(writer, sheet_name="Brand", index=False)
-
-            for sheetname in writer.sheets:
-                worksheet = writer.sheets[sheetname]
-                for col in worksheet.columns:
-                    max_length = 0
-                    column = col[0].column_letter
-                    for cell in col:
-                        try:
-                            if len(str(cell.value)) > max_length:
-                                max_length = len(str(cell.value))
-                        except:
-                            pass
-                    adjusted_width = (max_length + 2)
-                    worksheet.column_dimensions[column].width = adjusted_width
-        print(f"Processing complete. Your TB file has been processed. {updated_tb_file_path}.")
+        write_output_workbook(updated_tb_file_path, [
+            {'name': "Good for upload", 'df': good_for_upload_df, 'header_style': True},
+            {'name': "Platform", 'df': platform_df, 'header_style': True},
+            {'name': "Brand", 'df': brand_df, 'header_style': True}
+        ])
+        logger.info("Processing complete. Your TB file has been processed. %s.", updated_tb_file_path)
     except PermissionError as e:
-        messagebox.showerror("Error", f"Please close the file: {updated_tb_file_path} first.")
+        show_error(f"Please close the file: {updated_tb_file_path} first.")
         return
 
-    messagebox.showinfo("Process Complete", f"Processing complete. Your TB file has been processed. {updated_tb_file_path}.")
-    open_file_directory(updated_tb_file_path)
+    show_info("Process Complete", f"Processing complete. Your TB file has been processed. {updated_tb_file_path}.")
+    reveal_output(updated_tb_file_path)
 
 
-def lazada_manual_process(tb_file_path, pwp_file_path, save_dir, selected_promo):
-
-    def find_closest_column(df, target_col):
-        col_names = [str(col) for col in df.columns]
-        matches = get_close_matches(target_col, col_names, n=1, cutoff=0.6)
-        return matches[0] if matches else None
-
-    if not tb_file_path or not pwp_file_path or not save_dir or not selected_promo:
-        messagebox.showerror("Error", "Please select all files, directories, and promo.")
+def lazada_manual_process(tb, pwp_file_path, save_dir, selected_promo):
+    if not tb or not pwp_file_path or not save_dir or not selected_promo:
+        show_error("Please select all files, directories, and promo.")
         return
 
-    updated_tb_file_path = os.path.join(save_dir, "Updated_" + os.path.basename(tb_file_path))
+    updated_tb_file_path = output_file_path(save_dir, tb.path)
 
     if os.path.exists(updated_tb_file_path):
         os.chmod(updated_tb_file_path, 0o777)
 
     try:
-        tb_df = pd.read_excel(tb_file_path, sheet_name=0, header=0)
-    except PermissionError:
-        messagebox.showerror("Error", f"Please close the TB file: {os.path.basename(tb_file_path)} first.")
-        return
+        tb_df = tb.frame(header=0)
     except Exception as e:
-        messagebox.showerror("Error", "Please select correct TB file")
+        show_error("Please select correct TB file")
         return
 
     try:
-        pwp_df = pd.read_excel(pwp_file_path, sheet_name="Lzd | Campaign List", header=None)
-        pwp_df.columns = pwp_df.iloc[5]
-        pwp_df = pwp_df.drop(5).reset_index(drop=True)
+        pwp_df = read_pwp_sheet(pwp_file_path, "Lzd | Campaign List")
     except PermissionError:
-        messagebox.showerror("Error", f"Please close the PWP file: {os.path.basename(pwp_file_path)} first.")
+        show_error(f"Please close the PWP file: {os.path.basename(pwp_file_path)} first.")
         return
 
     tb_sku_col = 'Shop SKU'
@@ -409,62 +1980,66 @@ def lazada_manual_process(tb_file_path, pwp_file_path, save_dir, selected_promo)
     time_end_col = 'Time End'
     promo_name_col = 'Promo Name (Scheme)'
 
-    tb_sku_col = find_closest_column(tb_df, tb_sku_col) or tb_sku_col
-    pwp_sku_col = find_closest_column(pwp_df, pwp_sku_col) or pwp_sku_col
-    special_price_col = find_closest_column(tb_df, special_price_col) or special_price_col
-    pwp_discounted_price_col = find_closest_column(pwp_df, pwp_discounted_price_col) or pwp_discounted_price_col
-    special_price_start_col = find_closest_column(tb_df, special_price_start_col) or special_price_start_col
-    special_price_end_col = find_closest_column(tb_df, special_price_end_col) or special_price_end_col
-    date_start_col = find_closest_column(pwp_df, date_start_col) or date_start_col
-    date_end_col = find_closest_column(pwp_df, date_end_col) or date_end_col
-    time_start_col = find_closest_column(pwp_df, time_start_col) or time_start_col
-    time_end_col = find_closest_column(pwp_df, time_end_col) or time_end_col
-    promo_name_col = find_closest_column(pwp_df, promo_name_col) or promo_name_col
-
-    print(
-        f"Identified Columns:\nShop Sku: {tb_sku_col}\nPWP Shop Sku: {pwp_sku_col}\nSpecial Price: {special_price_col}\nDiscounted Price: {pwp_discounted_price_col}\nDate Start: {date_start_col}\nDate End: {date_end_col}\nTime Start: {time_start_col}\nTime End: {time_end_col}\nPromo Name: {promo_name_col}")
+    tb_sku_col = resolve_column('lazada', tb_df, tb_sku_col)
+    pwp_sku_col = resolve_column('lazada', pwp_df, pwp_sku_col)
+    special_price_col = resolve_column('lazada', tb_df, special_price_col)
+    pwp_discounted_price_col = resolve_column('lazada', pwp_df, pwp_discounted_price_col)
+    special_price_start_col = resolve_column('lazada', tb_df, special_price_start_col)
+    special_price_end_col = resolve_column('lazada', tb_df, special_price_end_col)
+    date_start_col = resolve_column('lazada', pwp_df, date_start_col)
+    date_end_col = resolve_column('lazada', pwp_df, date_end_col)
+    time_start_col = resolve_column('lazada', pwp_df, time_start_col)
+    time_end_col = resolve_column('lazada', pwp_df, time_end_col)
+    promo_name_col = resolve_column('lazada', pwp_df, promo_name_col)
+
+    if not all([tb_sku_col, pwp_sku_col, special_price_col, pwp_discounted_price_col, special_price_start_col, special_price_end_col,
+                date_start_col, date_end_col, time_start_col, time_end_col, promo_name_col]):
+        show_error("Required columns not found in the TB or PWP file.")
+        return
+
+    logger.debug("Identified Columns:\nShop Sku: %s\nPWP Shop Sku: %s\nSpecial Price: %s\nDiscounted Price: %s\nDate Start: %s\nDate End: %s\nTime Start: %s\nTime End: %s\nPromo Name: %s",
+                 tb_sku_col, pwp_sku_col, special_price_col, pwp_discounted_price_col, date_start_col, date_end_col, time_start_col, time_end_col, promo_name_col)
 
     if promo_name_col not in pwp_df.columns:
-        print(f"Error: '{promo_name_col}' column not found in PWP DataFrame.")
+        logger.error("'%s' column not found in PWP DataFrame.", promo_name_col)
         return
 
-    pwp_df[promo_name_col] = pwp_df[promo_name_col].astype(str).str.strip().str.lower()
     selected_promo = selected_promo.strip().lower()
 
-    filtered_pwp_df = pwp_df[pwp_df[promo_name_col] == selected_promo].reset_index(drop=True)
-    print("Filtered PWP DataFrame:")
-    print(filtered_pwp_df.head())
+    filtered_pwp_df = select_promo_rows(pwp_df, promo_name_col, selected_promo, normalize=True,
+                                        promo_index=loaded_promo_index(pwp_file_path, "Lzd | Campaign List")
+                                        ).reset_index(drop=True)
+    logger.debug("Filtered PWP DataFrame:\n%s", filtered_pwp_df.head())
 
     if filtered_pwp_df.empty:
-        messagebox.showerror("Error", f"No data found for promo '{selected_promo}' in the PWP file.")
+        show_error(f"No data found for promo '{selected_promo}' in the PWP file.")
         return
 
-    filtered_pwp_df[pwp_sku_col] = filtered_pwp_df[pwp_sku_col].astype(str).str.strip().str.upper()
-    filtered_pwp_df[pwp_discounted_price_col] = pd.to_numeric(filtered_pwp_df[pwp_discounted_price_col],
-                                                              errors='coerce')
+    filtered_pwp_df[pwp_sku_col] = normalize_ids(filtered_pwp_df[pwp_sku_col])
+    filtered_pwp_df[pwp_discounted_price_col], _ = parse_prices(filtered_pwp_df[pwp_discounted_price_col])
 
-    print("Normalized and Converted Data:")
-    print(filtered_pwp_df[[pwp_sku_col, pwp_discounted_price_col]].head())
+    logger.debug("Normalized and Converted Data:\n%s", filtered_pwp_df.head()[[pwp_sku_col, pwp_discounted_price_col]])
 
-    updated_tb_df = tb_df[tb_df[tb_sku_col].isin(filtered_pwp_df[pwp_sku_col])].copy()
+    updated_tb_df = tb_df.take(np.flatnonzero(tb_df[tb_sku_col].isin(filtered_pwp_df[pwp_sku_col])))
 
     if updated_tb_df.empty:
-        messagebox.showerror("Error", "No matching SKUs found in TB data for the selected promo.")
+        show_error("No matching SKUs found in TB data for the selected promo.")
         return
 
     # Clear the SpecialPrice Start and SpecialPrice End columns
     updated_tb_df[special_price_start_col] = ""
     updated_tb_df[special_price_end_col] = ""
 
+    report_progress('Matching', len(updated_tb_df))
     merged_df = pd.merge(updated_tb_df, filtered_pwp_df[
         [pwp_sku_col, pwp_discounted_price_col, date_start_col, date_end_col, time_start_col, time_end_col]],
                          left_on=tb_sku_col, right_on=pwp_sku_col, how='left')
 
     merged_df[special_price_col] = merged_df[pwp_discounted_price_col]
 
-    # Combine the date from PWP with the time from PWP for start and end dates
-    merged_df[special_price_start_col] = pd.to_datetime(merged_df[date_start_col].astype(str) + ' ' + filtered_pwp_df[time_start_col].astype(str))
-    merged_df[special_price_end_col] = pd.to_datetime(merged_df[date_end_col].astype(str) + ' ' + filtered_pwp_df[time_end_col].astype(str))
+    # Combine the date from PWP with the time from PWP for start and end dates, both taken from the merged rows
+    merged_df[special_price_start_col] = combine_date_time(merged_df[date_start_col], merged_df[time_start_col])
+    merged_df[special_price_end_col] = combine_date_time(merged_df[date_end_col], merged_df[time_end_col])
 
     # Ensure the values are treated as text
     merged_df[special_price_start_col] = merged_df[special_price_start_col].dt.strftime('%Y-%m-%d %H:%M:%S')
@@ -472,59 +2047,30 @@ def lazada_manual_process(tb_file_path, pwp_file_path, save_dir, selected_promo)
 
     final_tb_df = merged_df[tb_df.columns]
 
-    original_tb = pd.read_excel(tb_file_path, header=None)
-    description_rows = original_tb.iloc[:4]
+    # The header and description rows exactly as they are in the TB
+    description_rows = tb.rows(4)
 
-    final_df_with_description = pd.concat([description_rows, final_tb_df], ignore_index=True)
-
-    print("Final DataFrame for upload:")
-    print(final_df_with_description)
+    logger.debug("Final DataFrame for upload:\n%s", final_tb_df)
 
     try:
-        workbook = Workbook()
-        worksheet = workbook.active
-        worksheet.title = "Sheet1"
-
-        # Write the description rows to the worksheet
-        for r_idx, row in enumerate(dataframe_to_rows(description_rows, index=False, header=False), start=1):
-            for c_idx, value in enumerate(row, start=1):
-                cell = worksheet.cell(row=r_idx, column=c_idx, value=value)
-
-        # Write the data starting from A5
-        for r_idx, row in enumerate(dataframe_to_rows(final_tb_df, index=False, header=False), start=5):
-            for c_idx, value in enumerate(row, start=1):
-                cell = worksheet.cell(row=r_idx, column=c_idx, value=value)
-
-        for col in worksheet.columns:
-            max_length = 0
-            column = col[0].column_letter
-            for cell in col:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except TypeError:
-                    pass
-            adjusted_width = (max_length + 2)
-            worksheet.column_dimensions[column].width = adjusted_width
-
+        # The description rows go above the data, which starts at A5
         # Ensure the SpecialPrice Start and SpecialPrice End columns are treated as text
-        special_price_start_col_idx = final_tb_df.columns.get_loc(special_price_start_col) + 1
-        special_price_end_col_idx = final_tb_df.columns.get_loc(special_price_end_col) + 1
-
-        for cell in worksheet.iter_rows(min_row=5, max_row=worksheet.max_row, min_col=special_price_start_col_idx, max_col=special_price_start_col_idx):
-            cell[0].number_format = '@'
-        for cell in worksheet.iter_rows(min_row=5, max_row=worksheet.max_row, min_col=special_price_end_col_idx, max_col=special_price_end_col_idx):
-            cell[0].number_format = '@'
-
-        workbook.save(updated_tb_file_path)
-
-        messagebox.showinfo("Process Complete", f"File has been updated and saved to {updated_tb_file_path}.")
+        write_output_workbook(updated_tb_file_path, [{
+            'name': "Sheet1",
+            'df': final_tb_df,
+            'preamble': description_rows,
+            'header': None,
+            'number_formats': {special_price_start_col: '@', special_price_end_col: '@'},
+            'template': {'document': tb, 'data_row': 5}
+        }], write_only=True)
+
+        show_info("Process Complete", f"File has been updated and saved to {updated_tb_file_path}.")
     except PermissionError as e:
-        print(f"PermissionError: {e}. Ensure the file is not open or read-only and try again.")
+        logger.error("PermissionError: %s. Ensure the file is not open or read-only and try again.", e)
     except Exception as e:
-        print(f"An unexpected error occurred: {e}")
+        logger.exception("An unexpected error occurred: %s", e)
 
-    open_file_directory(updated_tb_file_path)
+    reveal_output(updated_tb_file_path)
 
 
 
@@ -534,20 +2080,14 @@ def lazada_manual_process(tb_file_path, pwp_file_path, save_dir, selected_promo)
 
 
 
-def shopee_process(tb_file_path, pwp_file_path, save_dir, selected_promo):
-    # Function to find the closest matching column name in the dataframe
-    def find_closest_column(df, target_col):
-        col_names = [str(col) for col in df.columns]
-        matches = get_close_matches(target_col, col_names, n=1, cutoff=0.6)
-        return matches[0] if matches else None
-
+def shopee_process(tb, pwp_file_path, save_dir, selected_promo):
     # Check if any required input is missing
-    if not tb_file_path or not pwp_file_path or not save_dir or not selected_promo or selected_promo == "Required Field":
-        messagebox.showerror("Error", "Please select all files, directories, and promo.")
+    if not tb or not pwp_file_path or not save_dir or not selected_promo or selected_promo == "Required Field":
+        show_error("Please select all files, directories, and promo.")
         return
 
     # Define the path for the updated TB file
-    updated_tb_file_path = os.path.join(save_dir, "Updated_" + os.path.basename(tb_file_path))
+    updated_tb_file_path = output_file_path(save_dir, tb.path)
 
     # Change file permissions if the updated file already exists
     if os.path.exists(updated_tb_file_path):
@@ -555,76 +2095,71 @@ def shopee_process(tb_file_path, pwp_file_path, save_dir, selected_promo):
 
     # Try to read the TB file
     try:
-        tb_df = pd.read_excel(tb_file_path, sheet_name=0, header=0)
-    except PermissionError:
-        messagebox.showerror("Error", f"Please close the TB file: {os.path.basename(tb_file_path)} first.")
-        return
+        tb_df = tb.frame(header=0)
     except Exception as e:
-        messagebox.showerror("Error", "Please select correct TB file")
+        show_error("Please select correct TB file")
         return
 
     # Try to read the PWP file
     try:
-        pwp_df = pd.read_excel(pwp_file_path, sheet_name="Shp | Campaign List", header=None)
+        pwp_df = read_pwp_sheet(pwp_file_path, "Shp | Campaign List")
     except PermissionError:
-        messagebox.showerror("Error", f"Please close the PWP file: {os.path.basename(pwp_file_path)} first.")
+        show_error(f"Please close the PWP file: {os.path.basename(pwp_file_path)} first.")
         return
 
-    # Set the column names for PWP dataframe
-    pwp_df.columns = pwp_df.iloc[5]
-    pwp_df = pwp_df.drop(5)
-
     # Find the closest matching column names
-    tb_id_col = find_closest_column(tb_df, 'Variation ID')
-    pwp_id_col = find_closest_column(pwp_df, 'Variation ID')
-    campaign_price_col = find_closest_column(tb_df, 'Recommended Campaign Price')
-    promo_name_col = find_closest_column(pwp_df, 'Promo Name (Scheme)')
-    discounted_price_col = find_closest_column(pwp_df, 'Discounted Price/ASP (VATIN)')
-    sales_price_col = find_closest_column(tb_df, 'Campaign Price')
+    tb_id_col = resolve_column('shopee', tb_df, 'Variation ID')
+    pwp_id_col = resolve_column('shopee', pwp_df, 'Variation ID')
+    campaign_price_col = resolve_column('shopee', tb_df, 'Recommended Campaign Price')
+    promo_name_col = resolve_column('shopee', pwp_df, 'Promo Name (Scheme)')
+    discounted_price_col = resolve_column('shopee', pwp_df, 'Discounted Price/ASP (VATIN)')
+    sales_price_col = resolve_column('shopee', tb_df, 'Campaign Price')
 
     if not all([tb_id_col, pwp_id_col, campaign_price_col, promo_name_col, discounted_price_col, sales_price_col]):
-        messagebox.showerror("Error", "Required columns not found in the TB or PWP file.")
+        show_error("Required columns not found in the TB or PWP file.")
         return
 
     # Check if the promo name column is found in PWP dataframe
     if promo_name_col not in pwp_df.columns:
-        print(f"Error: '{promo_name_col}' column not found in PWP DataFrame.")
+        logger.error("'%s' column not found in PWP DataFrame.", promo_name_col)
         return
 
     # Filter the PWP dataframe by the selected promo
-    filtered_pwp_df = pwp_df[pwp_df[promo_name_col] == selected_promo]
+    filtered_pwp_df = select_promo_rows(pwp_df, promo_name_col, selected_promo,
+                                        promo_index=loaded_promo_index(pwp_file_path, "Shp | Campaign List"))
 
     # Normalize and clean the SKU IDs for matching
-    tb_df[tb_id_col] = tb_df[tb_id_col].astype(str).str.strip().str.upper()
-    filtered_pwp_df.loc[:, pwp_id_col] = filtered_pwp_df[pwp_id_col].astype(str).str.strip().str.upper()
+    tb_df[tb_id_col] = normalize_ids(tb_df[tb_id_col])
+    filtered_pwp_df[pwp_id_col] = normalize_ids(filtered_pwp_df[pwp_id_col])
+
+    # The promo's PWP prices are parsed once, then joined onto the TB by Variation ID along with whether they
+    # parsed; first PWP row wins for duplicates
+    filtered_pwp_df[discounted_price_col], unparseable = parse_prices(filtered_pwp_df[discounted_price_col])
+    price_lookup = build_price_lookup(filtered_pwp_df, pwp_id_col, discounted_price_col)
+    unparseable_lookup = build_price_lookup(filtered_pwp_df.assign(**{discounted_price_col: unparseable}),
+                                            pwp_id_col, discounted_price_col)
+    in_pwp = tb_df[tb_id_col].isin(price_lookup.index)
+    sales_price = tb_df[tb_id_col].map(price_lookup)
+    invalid_price = tb_df[tb_id_col].map(unparseable_lookup).eq(True)
 
     # Convert price columns to numeric for comparison
-    tb_df[campaign_price_col] = pd.to_numeric(tb_df[campaign_price_col], errors='coerce')
-    filtered_pwp_df.loc[:, discounted_price_col] = pd.to_numeric(filtered_pwp_df[discounted_price_col], errors='coerce')
-
-    # Create a copy of the TB dataframe to store updated prices
-    good_for_upload_df = tb_df.copy()
-    platform_df = pd.DataFrame(columns=[tb_id_col, campaign_price_col, 'Escalation Reason'])
-    brand_df = pd.DataFrame(columns=[tb_id_col, campaign_price_col])
-
-    # Create a set of unique SKUs from the filtered PWP dataframe
-    tb_ids_in_pwp = set(filtered_pwp_df[pwp_id_col].dropna().unique())
-
-    # Update the TB dataframe with prices from the PWP dataframe
-    for idx, row in tb_df.iterrows():
-        product_id = row[tb_id_col]
-        if product_id in tb_ids_in_pwp:
-            matching_rows = filtered_pwp_df[filtered_pwp_df[pwp_id_col] == product_id]
-            if not matching_rows.empty:
-                for _, matching_row in matching_rows.iterrows():
-                    discounted_price = matching_row[discounted_price_col]
-                    good_for_upload_df.at[idx, sales_price_col] = discounted_price
-                    break
-        else:
-            brand_df = pd.concat([brand_df, pd.DataFrame({tb_id_col: [product_id], campaign_price_col: [row[campaign_price_col]]})], ignore_index=True)
+    tb_df[campaign_price_col], _ = parse_prices(tb_df[campaign_price_col])
+
+    # The updated prices go into this run's TB frame; the rows kept for upload are copied out of it below
+    tb_df[sales_price_col] = tb_df[sales_price_col].mask(in_pwp, sales_price)
+
+    # PWP prices that do not parse are escalated instead of silently dropped
+    platform_df = pd.DataFrame({
+        tb_id_col: tb_df.loc[invalid_price, tb_id_col],
+        campaign_price_col: sales_price[invalid_price],
+        'Escalation Reason': 'invalid price format'
+    }, columns=[tb_id_col, campaign_price_col, 'Escalation Reason'])
+
+    # TB IDs that are not in the promo go to the brand
+    brand_df = tb_df.loc[~in_pwp, [tb_id_col, campaign_price_col]]
 
     # Remove rows with missing campaign prices
-    good_for_upload_df = good_for_upload_df.dropna(subset=[sales_price_col])
+    good_for_upload_df = tb_df.dropna(subset=[sales_price_col])
 
     # Find SKUs in PWP dataframe that are not in TB dataframe
     pwp_ids_not_in_tb = filtered_pwp_df[~filtered_pwp_df[pwp_id_col].isin(tb_df[tb_id_col])]
@@ -638,63 +2173,41 @@ def shopee_process(tb_file_path, pwp_file_path, save_dir, selected_promo):
 
     # Save the updated dataframes to an Excel file
     try:
-        with pd.ExcelWriter(updated_tb_file_path, engine='openpyxl') as writer:
-            good_for_upload_df.to_excel(writer, sheet_name="Sheet1", index=False)
-            platform_df.to_excel(writer, sheet_name="Platform", index=False)
-            brand_df.to_excel(writer, sheet_name="Brand", index=False)
-            for sheetname in writer.sheets:
-                worksheet = writer.sheets[sheetname]
-                for col in worksheet.columns:
-                    max_length = 0
-                    column = col[0].column_letter
-                    for cell in col:
-                        try:
-                            if len(str(cell.value)) > max_length:
-                                max_length = len(str(cell.value))
-                        except:
-                            pass
-                    adjusted_width = (max_length + 2)
-                    worksheet.column_dimensions[column].width = adjusted_width
-        print(f"Processing complete. Your TB file has been processed. {updated_tb_file_path}.")
+        write_output_workbook(updated_tb_file_path, [
+            {'name': "Sheet1", 'df': good_for_upload_df, 'header_style': True},
+            {'name': "Platform", 'df': platform_df, 'header_style': True},
+            {'name': "Brand", 'df': brand_df, 'header_style': True}
+        ])
+        logger.info("Processing complete. Your TB file has been processed. %s.", updated_tb_file_path)
     except PermissionError as e:
-        messagebox.showerror("Error", f"Please close the file: {updated_tb_file_path} first.")
+        show_error(f"Please close the file: {updated_tb_file_path} first.")
         return
 
     # Notify the user that processing is complete and open the directory
-    messagebox.showinfo("Process Complete", f"Processing complete. Your TB file has been processed. {updated_tb_file_path}.")
-    open_file_directory(updated_tb_file_path)
-
+    show_info("Process Complete", f"Processing complete. Your TB file has been processed. {updated_tb_file_path}.")
+    reveal_output(updated_tb_file_path)
 
-def shopee_manual_process(tb_file_path, pwp_file_path, save_dir, selected_promo):
-    def find_closest_column(df, target_col):
-        col_names = [str(col) for col in df.columns]
-        matches = get_close_matches(target_col, col_names, n=1, cutoff=0.6)
-        return matches[0] if matches else None
 
-    if not tb_file_path or not pwp_file_path or not save_dir or not selected_promo:
-        messagebox.showerror("Error", "Please select all files, directories, and promo.")
+def shopee_manual_process(tb, pwp_file_path, save_dir, selected_promo):
+    if not tb or not pwp_file_path or not save_dir or not selected_promo:
+        show_error("Please select all files, directories, and promo.")
         return
 
-    updated_tb_file_path = os.path.join(save_dir, "Updated_" + os.path.basename(tb_file_path))
+    updated_tb_file_path = output_file_path(save_dir, tb.path)
 
     if os.path.exists(updated_tb_file_path):
         os.chmod(updated_tb_file_path, 0o777)
 
     try:
-        tb_df = pd.read_excel(tb_file_path, sheet_name=0, header=0)
-    except PermissionError:
-        messagebox.showerror("Error", f"Please close the TB file: {os.path.basename(tb_file_path)} first.")
-        return
+        tb_df = tb.frame(header=0)
     except Exception as e:
-        messagebox.showerror("Error", "Please select correct TB file")
+        show_error("Please select correct TB file")
         return
 
     try:
-        pwp_df = pd.read_excel(pwp_file_path, sheet_name="Shp | Campaign List", header=None)
-        pwp_df.columns = pwp_df.iloc[5]
-        pwp_df = pwp_df.drop(5).reset_index(drop=True)
+        pwp_df = read_pwp_sheet(pwp_file_path, "Shp | Campaign List")
     except PermissionError:
-        messagebox.showerror("Error", f"Please close the PWP file: {os.path.basename(pwp_file_path)} first.")
+        show_error(f"Please close the PWP file: {os.path.basename(pwp_file_path)} first.")
         return
 
     tb_id_col = 'Variation ID'
@@ -705,142 +2218,98 @@ def shopee_manual_process(tb_file_path, pwp_file_path, save_dir, selected_promo)
     pwp_discounted_price_col = 'Discounted Price/ASP (VATIN)'
     promo_name_col = 'Promo Name (Scheme)'
 
-    tb_id_col = find_closest_column(tb_df, tb_id_col) or tb_id_col
-    pwp_id_col = find_closest_column(pwp_df, pwp_id_col) or pwp_id_col
-    tb_product_id_col = find_closest_column(tb_df, tb_product_id_col) or tb_product_id_col
-    pwp_product_id_col = find_closest_column(pwp_df, pwp_product_id_col) or pwp_product_id_col
-    discount_price_col = find_closest_column(tb_df, discount_price_col) or discount_price_col
-    pwp_discounted_price_col = find_closest_column(pwp_df, pwp_discounted_price_col) or pwp_discounted_price_col
-    promo_name_col = find_closest_column(pwp_df, promo_name_col) or promo_name_col
+    tb_id_col = resolve_column('shopee', tb_df, tb_id_col)
+    pwp_id_col = resolve_column('shopee', pwp_df, pwp_id_col)
+    tb_product_id_col = resolve_column('shopee', tb_df, tb_product_id_col)
+    pwp_product_id_col = resolve_column('shopee', pwp_df, pwp_product_id_col)
+    discount_price_col = resolve_column('shopee', tb_df, discount_price_col)
+    pwp_discounted_price_col = resolve_column('shopee', pwp_df, pwp_discounted_price_col)
+    promo_name_col = resolve_column('shopee', pwp_df, promo_name_col)
 
     if not all([tb_id_col, pwp_id_col, tb_product_id_col, pwp_product_id_col, discount_price_col, pwp_discounted_price_col, promo_name_col]):
-        messagebox.showerror("Error", "Required columns not found in the TB or PWP file.")
+        show_error("Required columns not found in the TB or PWP file.")
         return
 
-    print(f"Identified Columns:\nVariation ID: {tb_id_col}\nPWP Variation ID: {pwp_id_col}\nProduct ID: {tb_product_id_col}\nPWP Product ID: {pwp_product_id_col}\nDiscount price: {discount_price_col}\nPromo Name: {promo_name_col}\nDiscounted Price: {pwp_discounted_price_col}")
+    logger.debug("Identified Columns:\nVariation ID: %s\nPWP Variation ID: %s\nProduct ID: %s\nPWP Product ID: %s\nDiscount price: %s\nPromo Name: %s\nDiscounted Price: %s",
+                 tb_id_col, pwp_id_col, tb_product_id_col, pwp_product_id_col, discount_price_col, promo_name_col, pwp_discounted_price_col)
 
     if promo_name_col not in pwp_df.columns:
-        print(f"Error: '{promo_name_col}' column not found in PWP DataFrame.")
+        logger.error("'%s' column not found in PWP DataFrame.", promo_name_col)
         return
 
-    pwp_df[promo_name_col] = pwp_df[promo_name_col].astype(str).str.strip().str.lower()
     selected_promo = selected_promo.strip().lower()
 
-    filtered_pwp_df = pwp_df[pwp_df[promo_name_col] == selected_promo].reset_index(drop=True)
-    print("Filtered PWP DataFrame:")
-    print(filtered_pwp_df.head())
+    filtered_pwp_df = select_promo_rows(pwp_df, promo_name_col, selected_promo, normalize=True,
+                                        promo_index=loaded_promo_index(pwp_file_path, "Shp | Campaign List")
+                                        ).reset_index(drop=True)
+    logger.debug("Filtered PWP DataFrame:\n%s", filtered_pwp_df.head())
 
     if filtered_pwp_df.empty:
-        messagebox.showerror("Error", f"No data found for promo '{selected_promo}' in the PWP file.")
+        show_error(f"No data found for promo '{selected_promo}' in the PWP file.")
         return
 
-    filtered_pwp_df[pwp_id_col] = filtered_pwp_df[pwp_id_col].astype(str).str.strip().str.upper()
-    filtered_pwp_df[pwp_discounted_price_col] = pd.to_numeric(filtered_pwp_df[pwp_discounted_price_col], errors='coerce')
+    filtered_pwp_df[pwp_id_col] = normalize_ids(filtered_pwp_df[pwp_id_col])
+    filtered_pwp_df[pwp_discounted_price_col], _ = parse_prices(filtered_pwp_df[pwp_discounted_price_col])
 
-    print("Normalized and Converted Data:")
-    print(filtered_pwp_df[[pwp_id_col, pwp_discounted_price_col, pwp_product_id_col]].head())
+    logger.debug("Normalized and Converted Data:\n%s", filtered_pwp_df.head()[[pwp_id_col, pwp_discounted_price_col, pwp_product_id_col]])
 
-    good_for_upload_df = tb_df.copy()
-    tb_ids_in_pwp = set(filtered_pwp_df[pwp_id_col].dropna().unique())
-    print(f"IDs in PWP: {tb_ids_in_pwp}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("IDs in PWP: %s", set(filtered_pwp_df[pwp_id_col].dropna().unique()))
 
-    for idx, row in filtered_pwp_df.iterrows():
-        product_id = row[pwp_id_col]
-        pwp_product_id = row[pwp_product_id_col]
-        discounted_price = row[pwp_discounted_price_col]
-        new_row = pd.DataFrame({
-            tb_product_id_col: [pwp_product_id],
-            tb_id_col: [product_id],
-            discount_price_col: [discounted_price]
-        })
-        good_for_upload_df = pd.concat([good_for_upload_df, new_row], ignore_index=True)
+    good_for_upload_df = append_pwp_rows(tb_df, filtered_pwp_df, {
+        pwp_product_id_col: tb_product_id_col,
+        pwp_id_col: tb_id_col,
+        pwp_discounted_price_col: discount_price_col
+    })
 
-    good_for_upload_df[tb_product_id_col] = good_for_upload_df[tb_product_id_col].astype(str)
-    good_for_upload_df[tb_id_col] = good_for_upload_df[tb_id_col].astype(str)
+    good_for_upload_df[tb_product_id_col] = ids_as_text(good_for_upload_df[tb_product_id_col])
+    good_for_upload_df[tb_id_col] = ids_as_text(good_for_upload_df[tb_id_col])
 
-    print("Good for upload DataFrame:")
-    print(good_for_upload_df)
+    logger.debug("Good for upload DataFrame:\n%s", good_for_upload_df)
 
     try:
-        workbook = Workbook()
-        worksheet = workbook.active
-        worksheet.title = "Sheet1"
-
-
-
-        for c_idx, value in enumerate(good_for_upload_df.columns, start=1):
-            worksheet.cell(row=1, column=c_idx, value=value)
-
-        for r_idx, row in enumerate(dataframe_to_rows(good_for_upload_df, index=False, header=False), start=2):
-            for c_idx, value in enumerate(row, start=1):
-                worksheet.cell(row=r_idx, column=c_idx, value=value)
-
-        for col in worksheet.columns:
-            max_length = 0
-            column = col[0].column_letter
-            for cell in col:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except TypeError:
-                    pass
-            adjusted_width = (max_length + 2)
-            worksheet.column_dimensions[column].width = adjusted_width
-            if column in ['B', 'C']:
-                worksheet.column_dimensions[column].width = max(worksheet.column_dimensions[column].width, 15)
-
-            if column in [tb_product_id_col, tb_id_col]:
-                for cell in col:
-                    if not isinstance(cell, openpyxl.cell.cell.MergedCell):
-                        cell.number_format = '@'
-
-        workbook.save(updated_tb_file_path)
-        print(f"Processing complete. Your manual file has been processed. {updated_tb_file_path}.")
+        write_output_workbook(updated_tb_file_path, [{
+            'name': "Sheet1",
+            'df': good_for_upload_df,
+            'min_widths': {'B': 15, 'C': 15},
+            'number_formats': {tb_product_id_col: '@', tb_id_col: '@'},
+            'template': {'document': tb, 'data_row': 2}
+        }], write_only=True)
+        logger.info("Processing complete. Your manual file has been processed. %s.", updated_tb_file_path)
     except PermissionError as e:
-        print(f"PermissionError: {e}. Ensure the file is not open or read-only and try again.")
+        logger.error("PermissionError: %s. Ensure the file is not open or read-only and try again.", e)
     except Exception as e:
-        print(f"An unexpected error occurred: {e}")
-
-    messagebox.showinfo("Process Complete", f"Processing complete. Your manual file has been processed. {updated_tb_file_path}.")
-    open_file_directory(updated_tb_file_path)
+        logger.exception("An unexpected error occurred: %s", e)
 
+    show_info("Process Complete", f"Processing complete. Your manual file has been processed. {updated_tb_file_path}.")
+    reveal_output(updated_tb_file_path)
 
-def tiktok_manual_process(tb_file_path, pwp_file_path, save_dir, selected_promo):
-    def find_closest_column(df, target_col):
-        col_names = [str(col) for col in df.columns]
-        matches = get_close_matches(target_col, col_names, n=1, cutoff=0.6)
-        return matches[0] if matches else None
 
-    if not tb_file_path or not pwp_file_path or not save_dir or not selected_promo:
-        messagebox.showerror("Error", "Please select all files, directories, and promo.")
+def tiktok_manual_process(tb, pwp_file_path, save_dir, selected_promo):
+    if not tb or not pwp_file_path or not save_dir or not selected_promo:
+        show_error("Please select all files, directories, and promo.")
         return
 
-    updated_tb_file_path = os.path.join(save_dir, "Updated_" + os.path.basename(tb_file_path))
+    updated_tb_file_path = output_file_path(save_dir, tb.path)
 
     if os.path.exists(updated_tb_file_path):
         os.chmod(updated_tb_file_path, 0o777)
 
-    tb_df = pd.read_excel(tb_file_path, sheet_name=0, header=0, dtype=str)
+    tb_df = tb.frame(header=0, dtype=str)
     if len(tb_df.columns) >= 2:
         tb_df = tb_df.iloc[:, :3]
         tb_df.columns = ["Product_id (required)", "SKU_id (required)", "Deal Price (required)"]
     else:
-        messagebox.showerror("Error", "The TB file does not have the expected number of columns.")
+        show_error("The TB file does not have the expected number of columns.")
         return
 
-    print("TB DataFrame after loading with specified headers:")
-    print(tb_df.head())
-
-    original_tb_df = tb_df.copy()
+    logger.debug("TB DataFrame after loading with specified headers:\n%s", tb_df.head())
 
     if tb_df.empty:
-        print("TB DataFrame is empty after loading. Continuing to populate with PWP data.")
+        logger.info("TB DataFrame is empty after loading. Continuing to populate with PWP data.")
 
-    pwp_df = pd.read_excel(pwp_file_path, sheet_name="TikTok | Campaign List", header=None, dtype=str)
-    pwp_df.columns = pwp_df.iloc[5]
-    pwp_df = pwp_df.drop(5).reset_index(drop=True)
-    print("PWP DataFrame after setting headers:")
-    print(pwp_df.head())
+    pwp_df = read_pwp_sheet(pwp_file_path, "TikTok | Campaign List")
+    logger.debug("PWP DataFrame after setting headers:\n%s", pwp_df.head())
 
     tb_id_col = 'SKU_id (required)'
     pwp_id_col = 'SKU ID'
@@ -850,148 +2319,103 @@ def tiktok_manual_process(tb_file_path, pwp_file_path, save_dir, selected_promo)
     discounted_price_col = 'Discounted Price/ASP (VATIN)'
     promo_name_col = 'Promo Name (Scheme)'
 
-    tb_id_col = find_closest_column(tb_df, tb_id_col) or tb_id_col
-    pwp_id_col = find_closest_column(pwp_df, pwp_id_col) or pwp_id_col
-    tb_product_id_col = find_closest_column(tb_df, tb_product_id_col) or tb_product_id_col
-    pwp_product_id_col = find_closest_column(pwp_df, pwp_product_id_col) or pwp_product_id_col
-    campaign_price_col = find_closest_column(tb_df, campaign_price_col) or campaign_price_col
-    discounted_price_col = find_closest_column(pwp_df, discounted_price_col) or discounted_price_col
-    promo_name_col = find_closest_column(pwp_df, promo_name_col) or promo_name_col
+    tb_id_col = resolve_column('tiktok', tb_df, tb_id_col)
+    pwp_id_col = resolve_column('tiktok', pwp_df, pwp_id_col)
+    tb_product_id_col = resolve_column('tiktok', tb_df, tb_product_id_col)
+    pwp_product_id_col = resolve_column('tiktok', pwp_df, pwp_product_id_col)
+    campaign_price_col = resolve_column('tiktok', tb_df, campaign_price_col)
+    discounted_price_col = resolve_column('tiktok', pwp_df, discounted_price_col)
+    promo_name_col = resolve_column('tiktok', pwp_df, promo_name_col)
 
     if not all([tb_id_col, pwp_id_col, tb_product_id_col, pwp_product_id_col, campaign_price_col, discounted_price_col, promo_name_col]):
-        messagebox.showerror("Error", "Required columns not found in the TB or PWP file.")
+        show_error("Required columns not found in the TB or PWP file.")
         return
 
-    print(f"Identified Columns:\nSKU ID: {tb_id_col}\nPWP SKU ID: {pwp_id_col}\nProduct ID: {tb_product_id_col}\nPWP Product ID: {pwp_product_id_col}\nCampaign Price: {campaign_price_col}\nPromo Name: {promo_name_col}\nDiscounted Price: {discounted_price_col}")
+    logger.debug("Identified Columns:\nSKU ID: %s\nPWP SKU ID: %s\nProduct ID: %s\nPWP Product ID: %s\nCampaign Price: %s\nPromo Name: %s\nDiscounted Price: %s",
+                 tb_id_col, pwp_id_col, tb_product_id_col, pwp_product_id_col, campaign_price_col, promo_name_col, discounted_price_col)
 
     if promo_name_col not in pwp_df.columns:
-        print(f"Error: '{promo_name_col}' column not found in PWP DataFrame.")
+        logger.error("'%s' column not found in PWP DataFrame.", promo_name_col)
         return
 
-    pwp_df[promo_name_col] = pwp_df[promo_name_col].astype(str).str.strip().str.lower()
     selected_promo = selected_promo.strip().lower()
 
-    filtered_pwp_df = pwp_df[pwp_df[promo_name_col] == selected_promo].reset_index(drop=True)
-    print("Filtered PWP DataFrame:")
-    print(filtered_pwp_df.head())
+    filtered_pwp_df = select_promo_rows(pwp_df, promo_name_col, selected_promo, normalize=True,
+                                        promo_index=loaded_promo_index(pwp_file_path, "TikTok | Campaign List")
+                                        ).reset_index(drop=True)
+    logger.debug("Filtered PWP DataFrame:\n%s", filtered_pwp_df.head())
 
     if filtered_pwp_df.empty:
-        messagebox.showerror("Error", f"No data found for promo '{selected_promo}' in the PWP file.")
+        show_error(f"No data found for promo '{selected_promo}' in the PWP file.")
         return
 
-    filtered_pwp_df[pwp_id_col] = filtered_pwp_df[pwp_id_col].astype(str).str.strip().str.upper()
-
-    filtered_pwp_df[discounted_price_col] = pd.to_numeric(filtered_pwp_df[discounted_price_col], errors='coerce')
+    filtered_pwp_df[pwp_id_col] = normalize_ids(filtered_pwp_df[pwp_id_col])
 
-    print("Normalized and Converted Data:")
-    print(filtered_pwp_df[[pwp_id_col, discounted_price_col, pwp_product_id_col]].head())
+    filtered_pwp_df[discounted_price_col], _ = parse_prices(filtered_pwp_df[discounted_price_col])
 
-    good_for_upload_df = original_tb_df.copy()
+    logger.debug("Normalized and Converted Data:\n%s", filtered_pwp_df.head()[[pwp_id_col, discounted_price_col, pwp_product_id_col]])
 
-    tb_ids_in_pwp = set(filtered_pwp_df[pwp_id_col].dropna().unique())
-    print(f"IDs in PWP: {tb_ids_in_pwp}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("IDs in PWP: %s", set(filtered_pwp_df[pwp_id_col].dropna().unique()))
 
-    for idx, row in filtered_pwp_df.iterrows():
-        product_id = row[pwp_id_col]
-        pwp_product_id = row[pwp_product_id_col]
-        discounted_price = row[discounted_price_col]
-        new_row = pd.DataFrame({
-            tb_product_id_col: [pwp_product_id],
-            tb_id_col: [product_id],
-            campaign_price_col: [discounted_price]
-        })
-        good_for_upload_df = pd.concat([good_for_upload_df, new_row], ignore_index=True)
+    good_for_upload_df = append_pwp_rows(tb_df, filtered_pwp_df, {
+        pwp_product_id_col: tb_product_id_col,
+        pwp_id_col: tb_id_col,
+        discounted_price_col: campaign_price_col
+    })
 
-    good_for_upload_df[tb_product_id_col] = good_for_upload_df[tb_product_id_col].astype(str)
-    good_for_upload_df[tb_id_col] = good_for_upload_df[tb_id_col].astype(str)
+    good_for_upload_df[tb_product_id_col] = ids_as_text(good_for_upload_df[tb_product_id_col])
+    good_for_upload_df[tb_id_col] = ids_as_text(good_for_upload_df[tb_id_col])
 
-    print("Good for upload DataFrame:")
-    print(good_for_upload_df)
+    logger.debug("Good for upload DataFrame:\n%s", good_for_upload_df)
 
     try:
-        workbook = Workbook()
-        worksheet = workbook.active
-        worksheet.title = "Good for upload"
-
-        # Load the TB workbook to get the header from D1 and E1
-        tb_wb = load_workbook(tb_file_path)
-        tb_ws = tb_wb.active
-        header_d1 = tb_ws['D1'].value
-        header_e1 = tb_ws['E1'].value
-
-        # Set header and dimensions for columns D and E in the new worksheet
-        worksheet['D2'] = header_d1
-        worksheet['E2'] = header_e1
-
-        for c_idx, value in enumerate(good_for_upload_df.columns, start=1):
-            worksheet.cell(row=2, column=c_idx, value=value)
-
-        for r_idx, row in enumerate(dataframe_to_rows(good_for_upload_df, index=False, header=False), start=3):
-            for c_idx, value in enumerate(row, start=1):
-                cell = worksheet.cell(row=r_idx, column=c_idx, value=value)
-                cell.number_format = '00000' if isinstance(value, str) and value.isdigit() and len(value) > 10 else '@'
-
-        for col in worksheet.columns:
-            max_length = 0
-            column = col[0].column_letter
-            for cell in col:
-                if isinstance(cell, openpyxl.cell.cell.MergedCell):
-                    continue
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except TypeError:
-                    pass
-            adjusted_width = (max_length + 2)
-            worksheet.column_dimensions[column].width = adjusted_width
-            if column in ['B', 'C']:
-                worksheet.column_dimensions[column].width = max(worksheet.column_dimensions[column].width, 15)
-
-        workbook.save(updated_tb_file_path)
-        print(f"Processing complete. Your manual file has been processed. {updated_tb_file_path}.")
+        # Get the header from D1 and E1 of the TB
+        first_row = tb.row(1) + [None] * 5
+        header_d1 = first_row[3]
+        header_e1 = first_row[4]
+
+        # Headers go on row 2 with D2/E2 taken from the TB, data starts on row 3 as text
+        write_output_workbook(updated_tb_file_path, [{
+            'name': "Good for upload",
+            'df': good_for_upload_df,
+            'preamble': [[]],
+            'header': list(good_for_upload_df.columns) + [header_d1, header_e1],
+            'min_widths': {'B': 15, 'C': 15},
+            'number_formats': {tb_product_id_col: '@', tb_id_col: '@', campaign_price_col: '@'}
+        }], write_only=True)
+        logger.info("Processing complete. Your manual file has been processed. %s.", updated_tb_file_path)
     except PermissionError as e:
-        print(f"PermissionError: {e}. Ensure the file is not open or read-only and try again.")
+        logger.error("PermissionError: %s. Ensure the file is not open or read-only and try again.", e)
     except Exception as e:
-        print(f"An unexpected error occurred: {e}")
+        logger.exception("An unexpected error occurred: %s", e)
 
-    messagebox.showinfo("Process Complete", f"Processing complete. Your manual file has been processed. {updated_tb_file_path}.")
-    open_file_directory(updated_tb_file_path)
+    show_info("Process Complete", f"Processing complete. Your manual file has been processed. {updated_tb_file_path}.")
+    reveal_output(updated_tb_file_path)
 
 
 
-def tiktok_process(tb_file_path, pwp_file_path, save_dir, selected_promo):
-    def find_closest_column(df, target_col):
-        col_names = [str(col) for col in df.columns]
-        matches = get_close_matches(target_col, col_names, n=1, cutoff=0.6)
-        return matches[0] if matches else None
-
-    if not tb_file_path or not pwp_file_path or not save_dir or not selected_promo:
-        messagebox.showerror("Error", "Please select all files, directories, and promo.")
+def tiktok_process(tb, pwp_file_path, save_dir, selected_promo):
+    if not tb or not pwp_file_path or not save_dir or not selected_promo:
+        show_error("Please select all files, directories, and promo.")
         return
 
-    updated_tb_file_path = os.path.join(save_dir, "Updated_" + os.path.basename(tb_file_path))
+    updated_tb_file_path = output_file_path(save_dir, tb.path)
 
     if os.path.exists(updated_tb_file_path):
         os.chmod(updated_tb_file_path, 0o777)
 
     # Read TB file with header in the second row, assuming the file has headers but no data
-    tb_df = pd.read_excel(tb_file_path, sheet_name=0, header=1)
-    print("TB DataFrame after loading with header in the second row:")
-    print(tb_df.head())
-
-    # Make a copy of the original TB DataFrame
-    original_tb_df = tb_df.copy()
+    tb_df = tb.frame(header=1)
+    logger.debug("TB DataFrame after loading with header in the second row:\n%s", tb_df.head())
 
     # Verify if TB DataFrame is empty
     if tb_df.empty:
-        print("TB DataFrame is empty after loading. Continuing to populate with PWP data.")
+        logger.info("TB DataFrame is empty after loading. Continuing to populate with PWP data.")
 
     # Read PWP file
-    pwp_df = pd.read_excel(pwp_file_path, sheet_name="TikTok | Campaign List", header=None)
-    pwp_df.columns = pwp_df.iloc[5]
-    pwp_df = pwp_df.drop(5).reset_index(drop=True)
-    print("PWP DataFrame after setting headers:")
-    print(pwp_df.head())
+    pwp_df = read_pwp_sheet(pwp_file_path, "TikTok | Campaign List")
+    logger.debug("PWP DataFrame after setting headers:\n%s", pwp_df.head())
 
     # Column names identification
     tb_id_col = 'SKU ID'
@@ -1002,127 +2426,344 @@ def tiktok_process(tb_file_path, pwp_file_path, save_dir, selected_promo):
     discounted_price_col = 'Discounted Price/ASP (VATIN)'
     promo_name_col = 'Promo Name (Scheme)'
 
-    tb_id_col = find_closest_column(tb_df, tb_id_col) or tb_id_col
-    pwp_id_col = find_closest_column(pwp_df, pwp_id_col) or pwp_id_col
-    tb_product_id_col = find_closest_column(tb_df, tb_product_id_col) or tb_product_id_col
-    pwp_product_id_col = find_closest_column(pwp_df, pwp_product_id_col) or pwp_product_id_col
-    campaign_price_col = find_closest_column(tb_df, campaign_price_col) or campaign_price_col
-    discounted_price_col = find_closest_column(pwp_df, discounted_price_col) or discounted_price_col
-    promo_name_col = find_closest_column(pwp_df, promo_name_col) or promo_name_col
+    tb_id_col = resolve_column('tiktok', tb_df, tb_id_col)
+    pwp_id_col = resolve_column('tiktok', pwp_df, pwp_id_col)
+    tb_product_id_col = resolve_column('tiktok', tb_df, tb_product_id_col)
+    pwp_product_id_col = resolve_column('tiktok', pwp_df, pwp_product_id_col)
+    campaign_price_col = resolve_column('tiktok', tb_df, campaign_price_col)
+    discounted_price_col = resolve_column('tiktok', pwp_df, discounted_price_col)
+    promo_name_col = resolve_column('tiktok', pwp_df, promo_name_col)
 
-    print(f"Identified Columns:\nSKU ID: {tb_id_col}\nPWP SKU ID: {pwp_id_col}\nProduct ID: {tb_product_id_col}\nPWP Product ID: {pwp_product_id_col}\nCampaign Price: {campaign_price_col}\nPromo Name: {promo_name_col}\nDiscounted Price: {discounted_price_col}")
+    if not all([tb_id_col, pwp_id_col, tb_product_id_col, pwp_product_id_col, campaign_price_col, discounted_price_col, promo_name_col]):
+        show_error("Required columns not found in the TB or PWP file.")
+        return
+
+    logger.debug("Identified Columns:\nSKU ID: %s\nPWP SKU ID: %s\nProduct ID: %s\nPWP Product ID: %s\nCampaign Price: %s\nPromo Name: %s\nDiscounted Price: %s",
+                 tb_id_col, pwp_id_col, tb_product_id_col, pwp_product_id_col, campaign_price_col, promo_name_col, discounted_price_col)
 
     if promo_name_col not in pwp_df.columns:
-        print(f"Error: '{promo_name_col}' column not found in PWP DataFrame.")
+        logger.error("'%s' column not found in PWP DataFrame.", promo_name_col)
         return
 
     # Normalize promo names to ensure consistent comparison
-    pwp_df[promo_name_col] = pwp_df[promo_name_col].astype(str).str.strip().str.lower()
     selected_promo = selected_promo.strip().lower()
 
-    filtered_pwp_df = pwp_df[pwp_df[promo_name_col] == selected_promo].reset_index(drop=True)
-    print("Filtered PWP DataFrame:")
-    print(filtered_pwp_df.head())
+    filtered_pwp_df = select_promo_rows(pwp_df, promo_name_col, selected_promo, normalize=True,
+                                        promo_index=loaded_promo_index(pwp_file_path, "TikTok | Campaign List")
+                                        ).reset_index(drop=True)
+    logger.debug("Filtered PWP DataFrame:\n%s", filtered_pwp_df.head())
 
     if filtered_pwp_df.empty:
-        messagebox.showerror("Error", f"No data found for promo '{selected_promo}' in the PWP file.")
+        show_error(f"No data found for promo '{selected_promo}' in the PWP file.")
         return
 
     # Normalize IDs to ensure correct matching
-    filtered_pwp_df[pwp_id_col] = filtered_pwp_df[pwp_id_col].astype(str).str.strip().str.upper()
+    filtered_pwp_df[pwp_id_col] = normalize_ids(filtered_pwp_df[pwp_id_col])
 
     # Ensure numeric comparison for prices
-    filtered_pwp_df[discounted_price_col] = pd.to_numeric(filtered_pwp_df[discounted_price_col], errors='coerce')
+    filtered_pwp_df[discounted_price_col], _ = parse_prices(filtered_pwp_df[discounted_price_col])
 
-    print("Normalized and Converted Data:")
-    print(filtered_pwp_df[[pwp_id_col, discounted_price_col, pwp_product_id_col]].head())
+    logger.debug("Normalized and Converted Data:\n%s", filtered_pwp_df.head()[[pwp_id_col, discounted_price_col, pwp_product_id_col]])
 
-    # Create a new DataFrame for good_for_upload_df
-    good_for_upload_df = original_tb_df.copy()
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("IDs in PWP: %s", set(filtered_pwp_df[pwp_id_col].dropna().unique()))
 
-    tb_ids_in_pwp = set(filtered_pwp_df[pwp_id_col].dropna().unique())
-    print(f"IDs in PWP: {tb_ids_in_pwp}")
-
-    for idx, row in filtered_pwp_df.iterrows():
-        product_id = row[pwp_id_col]
-        pwp_product_id = row[pwp_product_id_col]
-        discounted_price = row[discounted_price_col]
-        new_row = pd.DataFrame({
-            tb_product_id_col: [pwp_product_id],
-            tb_id_col: [product_id],
-            campaign_price_col: [discounted_price]
-        })
-        good_for_upload_df = pd.concat([good_for_upload_df, new_row], ignore_index=True)
+    # The TB rows followed by the promo's PWP rows, as a new frame
+    good_for_upload_df = append_pwp_rows(tb_df, filtered_pwp_df, {
+        pwp_product_id_col: tb_product_id_col,
+        pwp_id_col: tb_id_col,
+        discounted_price_col: campaign_price_col
+    })
 
     # Ensure the IDs are saved as text to prevent scientific notation
-    good_for_upload_df[tb_product_id_col] = good_for_upload_df[tb_product_id_col].astype(str)
-    good_for_upload_df[tb_id_col] = good_for_upload_df[tb_id_col].astype(str)
+    good_for_upload_df[tb_product_id_col] = ids_as_text(good_for_upload_df[tb_product_id_col])
+    good_for_upload_df[tb_id_col] = ids_as_text(good_for_upload_df[tb_id_col])
 
-    print("Good for upload DataFrame:")
-    print(good_for_upload_df)
+    logger.debug("Good for upload DataFrame:\n%s", good_for_upload_df)
 
     try:
-        # Create a new Workbook and add the headers and data
-        workbook = Workbook()
-        worksheet = workbook.active
-        worksheet.title = "Good for upload"
-
         # Copy the description from A1 of the TB file
-        tb_wb = load_workbook(tb_file_path)
-        tb_ws = tb_wb.active
-        description = tb_ws['A1'].value
+        description = (tb.row(1) + [None])[0]
 
         # Split the description into multiple lines
         description_lines = description.split('\n')
         description_wrapped = '\n'.join(description_lines)
 
-        # Add description in A1
-        worksheet['A1'] = description_wrapped
-        worksheet.row_dimensions[1].height = 112.50
-        worksheet.column_dimensions['A'].width = 52.73
-
-        # Add headers in the second row
-        for c_idx, value in enumerate(good_for_upload_df.columns, start=1):
-            worksheet.cell(row=2, column=c_idx, value=value)
-
-        # Write the updated DataFrame starting from the third row
-        for r_idx, row in enumerate(dataframe_to_rows(good_for_upload_df, index=False, header=False), start=3):
-            for c_idx, value in enumerate(row, start=1):
-                worksheet.cell(row=r_idx, column=c_idx, value=value)
-
-        # Adjust column widths for readability
-        for col in worksheet.columns:
-            max_length = 0
-            column = col[0].column_letter
-            for cell in col:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except TypeError:
-                    pass
-            adjusted_width = (max_length + 2)
-            worksheet.column_dimensions[column].width = adjusted_width
-            if column in ['B', 'C']:  # Adjust specifically for columns B and C
-                worksheet.column_dimensions[column].width = max(worksheet.column_dimensions[column].width, 15)
-
-            if column in [tb_product_id_col, tb_id_col]:
-                for cell in col:
-                    if not isinstance(cell, openpyxl.cell.cell.MergedCell):
-                        cell.number_format = '@'  # Setting text format to prevent scientific notation
-
-        # Save the workbook
-        workbook.save(updated_tb_file_path)
-        print(f"Processing complete. Updated file saved to {updated_tb_file_path}.")
+        # Description in A1, headers in the second row and the data from the third row
+        write_output_workbook(updated_tb_file_path, [{
+            'name': "Good for upload",
+            'df': good_for_upload_df,
+            'preamble': [[description_wrapped]],
+            'row_heights': {1: 112.50},
+            'min_widths': {'B': 15, 'C': 15},
+            'number_formats': {tb_product_id_col: '@', tb_id_col: '@'},
+            'template': {'document': tb, 'data_row': 3}
+        }], write_only=True)
+        logger.info("Processing complete. Updated file saved to %s.", updated_tb_file_path)
     except PermissionError as e:
-        print(f"PermissionError: {e}. Ensure the file is not open or read-only and try again.")
+        logger.error("PermissionError: %s. Ensure the file is not open or read-only and try again.", e)
     except Exception as e:
-        print(f"An unexpected error occurred: {e}")
+        logger.exception("An unexpected error occurred: %s", e)
+
+    show_info("Process Complete", f"Processing complete. Updated file saved to {updated_tb_file_path}.")
+    reveal_output(updated_tb_file_path)
+
+
+PROCESSORS = {
+    ('lazada', 'regular'): lazada_process,
+    ('lazada', 'manual'): lazada_manual_process,
+    ('shopee', 'regular'): shopee_process,
+    ('shopee', 'manual'): shopee_manual_process,
+    ('tiktok', 'regular'): tiktok_process,
+    ('tiktok', 'manual'): tiktok_manual_process
+}
+
+
+def process_all_promos(tb, pwp_file_path, save_dir, sheet_name, processor):
+    global batch_messages, promo_run
+
+    try:
+        promo_names = read_promo_names(pwp_file_path, sheet_name)
+    except PermissionError:
+        show_error(f"Please close the PWP file: {os.path.basename(pwp_file_path)} first.")
+        return []
+
+    # Each promo runs through the processor quietly; its messages are reported once at the end
+    outer_messages = batch_messages
+    messages = []
+    written = []
+    promo_run = {'promo': None, 'index': 0, 'count': len(promo_names), 'groups': {}, 'file_names': {}}
+    try:
+        for index, promo in enumerate(promo_names):
+            promo_run.update(promo=promo, index=index)
+            updated_tb_file_path = output_file_path(save_dir, tb.path)
+            start = time.time()
+            batch_messages = []
+            try:
+                processor(tb, pwp_file_path, save_dir, promo)
+            finally:
+                messages.extend(dict(message, promo=promo) for message in batch_messages)
+            if os.path.exists(updated_tb_file_path) and os.path.getmtime(updated_tb_file_path) >= start - 1:
+                written.append(updated_tb_file_path)
+    finally:
+        batch_messages = outer_messages
+        promo_run = None
+
+    if batch_messages is not None:
+        batch_messages.extend(messages)
+        return written
+
+    errors = [f"{message['promo']}: {message['message']}" for message in messages if message['level'] == 'error']
+    if errors:
+        show_error("\n".join(errors[:10] + ([f"...and {len(errors) - 10} more."] if len(errors) > 10 else [])))
+    show_info("Process Complete", f"{len(written)} of {len(promo_names)} promos processed. Your files have been saved to {save_dir}.")
+    if written:
+        reveal_output(written[0])
+    return written
+
+
+def process_tb_file(tb_file_path, function, *args):
+    # Runs a processor, or process_all_promos, on the TB document of tb_file_path
+    try:
+        tb = open_tb_document(tb_file_path) if tb_file_path else None
+    except PermissionError:
+        show_error(f"Please close the TB file: {os.path.basename(tb_file_path)} first.")
+        return None
+    except Exception as e:
+        show_error("Please select correct TB file")
+        return None
+    return function(tb, *args)
+
+
+MANIFEST_FIELDS = ['platform', 'mode', 'tb', 'pwp', 'promo', 'output_dir']
+
+
+def read_manifest(manifest_path):
+    # A JSON list of job objects, or a CSV with one job per row; relative paths are taken from the manifest's folder
+    if manifest_path.lower().endswith('.csv'):
+        jobs = pd.read_csv(manifest_path, dtype=str, keep_default_na=False).to_dict('records')
+    else:
+        with open(manifest_path, encoding='utf-8') as f:
+            jobs = json.load(f)
+        if isinstance(jobs, dict):
+            jobs = jobs.get('jobs', [])
+
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    for job in jobs:
+        for field in ('tb', 'pwp', 'output_dir'):
+            if job.get(field):
+                job[field] = os.path.join(base_dir, os.path.expanduser(str(job[field])))
+    return jobs
+
+
+def run_batch_job(job):
+    global batch_messages
+
+    result = {field: job.get(field) for field in MANIFEST_FIELDS}
+    result.update({'status': 'error', 'output': None, 'messages': []})
+    platform = str(job.get('platform') or '').strip().lower()
+    mode = str(job.get('mode') or 'regular').strip().lower()
+    processor = PROCESSORS.get((platform, mode))
+    missing = [field for field in ('tb', 'pwp', 'promo', 'output_dir') if not job.get(field)]
+    if processor is None:
+        result['messages'].append({'level': 'error', 'message': f"Unknown platform/mode: {platform}/{mode}"})
+        return result
+    if missing:
+        result['messages'].append({'level': 'error', 'message': f"Missing fields: {', '.join(missing)}"})
+        return result
+
+    tb_file_path, save_dir = job['tb'], job['output_dir']
+    updated_tb_file_path = output_file_path(save_dir, tb_file_path)
+    all_promos = str(job['promo']) in ('*', ALL_PROMOS)
+    os.makedirs(save_dir, exist_ok=True)
+
+    start = time.time()
+    batch_messages = result['messages']
+    details = {'source': 'batch', 'function': processor.__name__, 'tb': tb_file_path, 'promo': str(job['promo'])}
+    try:
+        if all_promos:
+            result['output'] = run_instrumented(details, process_tb_file, tb_file_path, process_all_promos, job['pwp'],
+                                                save_dir, PROMO_SHEETS[platform], processor) or []
+        else:
+            run_instrumented(details, process_tb_file, tb_file_path, processor, job['pwp'], save_dir, str(job['promo']))
+    except Exception as e:
+        result['messages'].append({'level': 'error', 'message': f"{type(e).__name__}: {e}"})
+    finally:
+        batch_messages = None
+        drop_tb_document(tb_file_path)
+    result['seconds'] = round(time.time() - start, 3)
+
+    has_errors = any(message['level'] == 'error' for message in result['messages'])
+    if all_promos:
+        if result['output']:
+            result['status'] = 'partial' if has_errors else 'ok'
+        elif not result['messages']:
+            result['messages'].append({'level': 'error', 'message': "No output files were written."})
+        return result
+
+    # Some processors only print write failures, so the output file itself decides success
+    written = os.path.exists(updated_tb_file_path) and os.path.getmtime(updated_tb_file_path) >= start - 1
+    if written and not has_errors:
+        result['status'] = 'ok'
+        result['output'] = updated_tb_file_path
+    elif not result['messages']:
+        result['messages'].append({'level': 'error', 'message': "The output file was not written."})
+    return result
+
+
+def configure_logging():
+    # Log records go to stderr; safe to call again, e.g. in every pool worker
+    logging.basicConfig(format="%(asctime)s %(levelname)s %(message)s")
+    level = str(os.environ.get("GDEC_LOG_LEVEL") or "INFO").upper()
+    logger.setLevel(level if isinstance(logging.getLevelName(level), int) else logging.INFO)
+
+
+def run_batch_job_quietly(job):
+    # Diagnostics go to stderr so stdout carries only the summary
+    configure_logging()
+    with contextlib.redirect_stdout(sys.stderr):
+        return run_batch_job(job)
+
+
+def prime_pwp_sheets(jobs):
+    # Parse each shared campaign sheet once so workers load the memory-mapped Arrow copy from the disk cache
+    sheets = {(job['pwp'], PROMO_SHEETS[str(job.get('platform')).strip().lower()]) for job in jobs
+              if job.get('pwp') and str(job.get('platform') or '').strip().lower() in PROMO_SHEETS}
+    for pwp_file_path, sheet_name in sheets:
+        try:
+            read_pwp_sheet(pwp_file_path, sheet_name)
+        except Exception as e:
+            # The job reading this sheet reports the error itself
+            logger.warning("Could not pre-parse '%s' from %s: %s", sheet_name, pwp_file_path, e)
+
+
+def run_batch(manifest_path, workers=None):
+    jobs = read_manifest(manifest_path)
+    workers = max(1, min(workers or os.cpu_count() or 1, len(jobs)))
+    results = [None] * len(jobs)
+    done = 0
+
+    def job_finished(index, result):
+        nonlocal done
+        results[index] = result
+        done += 1
+        print(f"[{done}/{len(jobs)}] {result['status']}: {jobs[index].get('tb')}", file=sys.stderr)
+
+    if workers == 1:
+        for index, job in enumerate(jobs):
+            job_finished(index, run_batch_job_quietly(job))
+    else:
+        with contextlib.redirect_stdout(sys.stderr):
+            prime_pwp_sheets(jobs)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(run_batch_job_quietly, job): index for index, job in enumerate(jobs)}
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # The worker itself died, e.g. out of memory
+                    result = {field: jobs[index].get(field) for field in MANIFEST_FIELDS}
+                    result.update({'status': 'error', 'output': None,
+                                   'messages': [{'level': 'error', 'message': f"{type(e).__name__}: {e}"}]})
+                job_finished(index, result)
+
+    return {
+        'manifest': os.path.abspath(manifest_path),
+        'workers': workers,
+        'total': len(results),
+        'succeeded': sum(result['status'] == 'ok' for result in results),
+        'failed': sum(result['status'] != 'ok' for result in results),
+        'jobs': results
+    }
+
 
-    messagebox.showinfo("Process Complete", f"Processing complete. Updated file saved to {updated_tb_file_path}.")
-    open_file_directory(updated_tb_file_path)
+def batch_main(argv):
+    parser = argparse.ArgumentParser(description="Run Price Checker jobs from a manifest without the GUI.")
+    parser.add_argument('--batch', metavar='MANIFEST', required=True,
+                        help="JSON or CSV manifest with platform, mode, tb, pwp, promo and output_dir per job; "
+                             f"promo '*' or '{ALL_PROMOS}' writes one output per promo")
+    parser.add_argument('--summary', metavar='PATH', help="also write the JSON summary to this file")
+    parser.add_argument('--workers', type=int, metavar='N', help="parallel worker processes (default: one per core)")
+    parser.add_argument('--profile', action='store_true',
+                        help="dump a cProfile of every job next to the run log (same as GDEC_PROFILE=1)")
+    parser.add_argument('--trace-memory', action='store_true',
+                        help="log peak traced memory per stage, slows jobs down (same as GDEC_TRACE_MEMORY=1)")
+    parser.add_argument('--output-mode', choices=['template', 'rebuild'],
+                        help="fill a copy of each TB or write new upload workbooks (same as GDEC_OUTPUT_MODE, "
+                             "default template)")
+    parser.add_argument('--log-level', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'], type=str.upper,
+                        help="diagnostics written to stderr; DEBUG dumps the DataFrames of each step "
+                             "(same as GDEC_LOG_LEVEL, default INFO)")
+    args = parser.parse_args(argv)
+    # Set in the environment as well so pool workers started fresh pick them up
+    if args.log_level:
+        os.environ["GDEC_LOG_LEVEL"] = args.log_level
+    if args.output_mode:
+        global OUTPUT_MODE
+        os.environ["GDEC_OUTPUT_MODE"] = OUTPUT_MODE = args.output_mode
+    configure_logging()
+    if args.profile:
+        os.environ["GDEC_PROFILE"] = "1"
+        RUN_LOG['profile'] = True
+    if args.trace_memory:
+        os.environ["GDEC_TRACE_MEMORY"] = "1"
+        RUN_LOG['trace_memory'] = True
+
+    summary = run_batch(args.batch, args.workers)
+    summary_json = json.dumps(summary, indent=2, default=str)
+    if args.summary:
+        with open(args.summary, 'w', encoding='utf-8') as f:
+            f.write(summary_json)
+    print(summary_json)
+    return 0 if summary['failed'] == 0 else 1
 
 
 def main():
+    if ctk is None:
+        sys.exit("The Price Checker window needs customtkinter and tkinter (pip install customtkinter). "
+                 "Use --batch MANIFEST to run without them.")
+    configure_logging()
     app = ctk.CTk()
     app.title("GDEC Price Checker")
 
@@ -1144,9 +2785,9 @@ def main():
     tabview = ctk.CTkTabview(app, width=window_width - 40, height=window_height - 100)
     tabview.pack(pady=20)
 
-    create_tab(tabview, "Lazada", lazada_process, lazada_manual_process, "Lzd | Campaign List", window_width)
-    create_tab(tabview, "Shopee", shopee_process, shopee_manual_process, "Shp | Campaign List", window_width)
-    create_tab(tabview, "TikTok", tiktok_process, tiktok_manual_process, "TikTok | Campaign List", window_width)
+    create_tab(tabview, "Lazada", lazada_process, lazada_manual_process, PROMO_SHEETS['lazada'], window_width)
+    create_tab(tabview, "Shopee", shopee_process, shopee_manual_process, PROMO_SHEETS['shopee'], window_width)
+    create_tab(tabview, "TikTok", tiktok_process, tiktok_manual_process, PROMO_SHEETS['tiktok'], window_width)
 
     tabview.set("Lazada")
 
@@ -1157,4 +2798,6 @@ def main():
 
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        sys.exit(batch_main(sys.argv[1:]))
     main()
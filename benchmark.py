@@ -0,0 +1,221 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import contextlib
+import datetime
+import tempfile
+import importlib.util
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from openpyxl.workbook import Workbook
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "GDEC Price-Checker.py")
+
+DEFAULT_SIZES = [1000, 10000, 100000, 500000]
+BENCHMARK_PROMO = "Mega Sale"
+OTHER_PROMOS = ["Payday Sale", "Flash Deal", "Brand Day"]
+
+PWP_HEADER = ['Promo Name (Scheme)', 'SHOP SKU', 'Variation ID', 'Product ID', 'SKU ID',
+              'Discounted Price/ASP (VATIN)', 'Date Start', 'Time Start', 'Date End', 'Time End', 'Remarks']
+
+# File name of each benchmarked processor's TB
+TB_FILES = {
+    'lazada_process': "lazada_regular",
+    'lazada_manual_process': "lazada_manual",
+    'shopee_process': "shopee_regular",
+    'shopee_manual_process': "shopee_manual",
+    'tiktok_process': "tiktok_regular",
+    'tiktok_manual_process': "tiktok_manual"
+}
+
+
+def load_price_checker():
+    spec = importlib.util.spec_from_file_location("price_checker", APP_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def peak_rss_bytes():
+    # Peak resident memory of this process so far, None when the platform cannot tell
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+            return psutil.Process().memory_info().peak_wset
+        except (ImportError, AttributeError):
+            return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def pwp_price(rnd):
+    # Mostly plain numbers, with the currency-formatted and junk values real campaign lists carry
+    roll = rnd.random()
+    if roll < 0.02:
+        return f"₱{rnd.randint(100, 5000):,}.00"
+    if roll < 0.03:
+        return "TBA"
+    if roll < 0.04:
+        return None
+    return round(rnd.uniform(50, 5000), 2)
+
+
+def make_pwp(file_path, sku_count, seed=1):
+    # Every SKU is in the benchmark promo; one in ten also has a row under another promo
+    rnd = random.Random(seed)
+    workbook = Workbook(write_only=True)
+    date_start = datetime.datetime(2024, 11, 11)
+    date_end = datetime.datetime(2024, 11, 12)
+    for sheet_name in ["Lzd | Campaign List", "Shp | Campaign List", "TikTok | Campaign List"]:
+        worksheet = workbook.create_sheet(sheet_name)
+        worksheet.append([f"{sheet_name} - campaign master"])
+        worksheet.append(["Prepared by: Campaign Team"])
+        worksheet.append([f"Generated {datetime.date.today().isoformat()}"])
+        worksheet.append([])
+        worksheet.append(["Do not edit the header row"])
+        worksheet.append(PWP_HEADER)
+        for i in range(sku_count):
+            promos = [BENCHMARK_PROMO] + ([OTHER_PROMOS[i % len(OTHER_PROMOS)]] if i % 10 == 0 else [])
+            for promo in promos:
+                worksheet.append([promo, f"SKU{i:07d}", 10 ** 11 + i, 10 ** 12 + i // 3, str(17 * 10 ** 15 + i),
+                                  pwp_price(rnd), date_start, datetime.time(0, 0), date_end,
+                                  datetime.time(23, 59, 59), None])
+    workbook.save(file_path)
+
+
+def tb_skus(sku_count):
+    # About 85% of the TB SKUs are in the promo, the rest only belong to the brand
+    for i in range(sku_count):
+        yield i if i % 7 else sku_count + i
+
+
+def make_tb(file_path, processor_name, sku_count, seed=2):
+    rnd = random.Random(seed)
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet()
+
+    if processor_name == 'lazada_process':
+        worksheet.append(['Seller Sku', 'Shop Sku', 'Campaign Price', 'Recommended Price', 'Stock'])
+        for i in tb_skus(sku_count):
+            worksheet.append([f"seller-{i}", f"SKU{i:07d}", None, round(rnd.uniform(50, 5000), 2), rnd.randint(0, 500)])
+    elif processor_name == 'lazada_manual_process':
+        worksheet.append(['Product Name', 'Shop SKU', 'SpecialPrice', 'SpecialPrice Start', 'SpecialPrice End'])
+        for row in range(3):
+            worksheet.append([f"Description {row + 1}", "Required", "Required", "yyyy-mm-dd hh:mm:ss", "yyyy-mm-dd hh:mm:ss"])
+        for i in tb_skus(sku_count):
+            worksheet.append([f"Product {i}", f"SKU{i:07d}", None, None, None])
+    elif processor_name == 'shopee_process':
+        worksheet.append(['Product ID', 'Variation ID', 'Recommended Campaign Price', 'Campaign Price', 'Stock'])
+        for i in tb_skus(sku_count):
+            worksheet.append([10 ** 12 + i // 3, 10 ** 11 + i, round(rnd.uniform(50, 5000), 2), None, rnd.randint(0, 500)])
+    elif processor_name == 'shopee_manual_process':
+        # Manual upload templates come empty and are filled from the PWP
+        worksheet.append(['Product ID', 'Variation ID', 'Discount price'])
+    elif processor_name == 'tiktok_process':
+        worksheet.append(["Fill in the SKUs below.\nDo not change the header.\nPrices are in PHP."])
+        worksheet.append(['Product ID', 'SKU ID', 'Campaign price'])
+    elif processor_name == 'tiktok_manual_process':
+        worksheet.append(['Product_id (required)', 'SKU_id (required)', 'Deal Price (required)', 'Stock (optional)',
+                          'Limit (optional)'])
+    workbook.save(file_path)
+
+
+def benchmark_files(data_dir, sku_count):
+    # Generated workbooks are kept and reused, large ones take a while to write
+    os.makedirs(data_dir, exist_ok=True)
+    pwp_file_path = os.path.join(data_dir, f"pwp_{sku_count}.xlsx")
+    if not os.path.exists(pwp_file_path):
+        print(f"Generating {pwp_file_path}")
+        make_pwp(pwp_file_path, sku_count)
+    tb_file_paths = {}
+    for processor_name, file_name in TB_FILES.items():
+        tb_file_paths[processor_name] = os.path.join(data_dir, f"{file_name}_{sku_count}.xlsx")
+        if not os.path.exists(tb_file_paths[processor_name]):
+            print(f"Generating {tb_file_paths[processor_name]}")
+            make_tb(tb_file_paths[processor_name], processor_name, sku_count)
+    return pwp_file_path, tb_file_paths
+
+
+def run_one(processor_name, tb_file_path, pwp_file_path, save_dir):
+    # Runs in its own process so peak RSS belongs to this processor alone
+    app = load_price_checker()
+    app.batch_messages = []
+    stages = []
+    clock = {'stage': "Setup", 'start': time.perf_counter()}
+
+    def stage_reached(stage):
+        if stage == clock['stage']:
+            return
+        now = time.perf_counter()
+        stages.append({'stage': clock['stage'], 'seconds': round(now - clock['start'], 4), 'peak_rss': peak_rss_bytes()})
+        clock.update(stage=stage, start=now)
+
+    app.stage_listeners.append(stage_reached)
+    with tempfile.TemporaryDirectory() as cache_dir, open(os.devnull, 'w') as devnull:
+        # Cold start: nothing parsed in memory or on disk from an earlier run. The processors' diagnostics are dropped
+        app.PWP_DISK_CACHE_DIR = cache_dir
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(devnull):
+            app.process_tb_file(tb_file_path, getattr(app, processor_name), pwp_file_path, save_dir, BENCHMARK_PROMO)
+        wall = time.perf_counter() - start
+        stage_reached("Done")
+
+    return {
+        'processor': processor_name,
+        'seconds': round(wall, 4),
+        'peak_rss': peak_rss_bytes(),
+        'stages': stages,
+        'messages': app.batch_messages
+    }
+
+
+def run_benchmarks(sizes, processor_names, data_dir, repeat=1):
+    results = []
+    spawn = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as save_dir:
+        for sku_count in sizes:
+            pwp_file_path, tb_file_paths = benchmark_files(data_dir, sku_count)
+            for processor_name in processor_names:
+                for attempt in range(repeat):
+                    with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as executor:
+                        result = executor.submit(run_one, processor_name, tb_file_paths[processor_name],
+                                                 pwp_file_path, save_dir).result()
+                    result.update(skus=sku_count, attempt=attempt + 1)
+                    results.append(result)
+                    print(format_result(result))
+    return results
+
+
+def format_result(result):
+    peak = f"{result['peak_rss'] / 1024 ** 2:.0f} MB" if result['peak_rss'] else "n/a"
+    stages = ", ".join(f"{stage['stage']} {stage['seconds']:.2f}s" for stage in result['stages'])
+    return f"{result['processor']:<24}{result['skus']:>8} SKUs {result['seconds']:>9.2f}s  peak {peak:>8}  [{stages}]"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time each Price Checker processor on generated TB and PWP workbooks.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, metavar='SKUS',
+                        help="SKU counts to benchmark (default: %(default)s)")
+    parser.add_argument('--processors', nargs='+', choices=list(TB_FILES), default=list(TB_FILES),
+                        help="processors to run (default: all six)")
+    parser.add_argument('--data-dir', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_data"),
+                        help="where generated workbooks are kept between runs")
+    parser.add_argument('--repeat', type=int, default=1, help="runs per processor and size")
+    parser.add_argument('--output', metavar='PATH', help="write the results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.sizes, args.processors, args.data_dir, args.repeat)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'python': sys.version.split()[0], 'platform': sys.platform, 'results': results}, f, indent=2,
+                      default=str)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())